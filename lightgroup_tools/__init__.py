@@ -9,6 +9,7 @@ bl_info = {
 }
 
 import bpy
+from . import jobs
 from . import operators
 from . import updater
 
@@ -29,6 +30,8 @@ class LIGHTGROUP_PT_main_panel(bpy.types.Panel):
         if addon_name in context.preferences.addons:
             prefs = context.preferences.addons[addon_name].preferences
         
+        jobs.draw_status(layout)
+        
         layout.label(text="Setup:")
         layout.operator("lightgroup.clear_all_lightgroups", icon='X', text="Clear All Lightgroups")
         layout.operator("lightgroup.create_for_each_light", icon='LIGHT', text="Create Lightgroups for Each Light")
@@ -38,6 +41,14 @@ class LIGHTGROUP_PT_main_panel(bpy.types.Panel):
         
         layout.label(text="Compositor:")
         layout.operator("lightgroup.denoise_all_cycles", icon='NODE_COMPOSITING')
+        op = layout.operator("lightgroup.denoise_all_cycles", icon='DISK_DRIVE', text="Setup Denoise + Pass Cache")
+        op.write_pass_cache = True
+        op = layout.operator("lightgroup.denoise_all_cycles", icon='SELECT_SET', text="Setup Denoise + Crop Localized")
+        op.crop_localized = True
+        layout.operator("lightgroup.recomposite_from_cache", icon='FILE_REFRESH')
+        layout.operator("lightgroup.clear_scan_cache", icon='TRASH')
+        if context.object is not None:
+            layout.prop(context.object, "lightgroup_full_frame")
         
         layout.separator()
         
@@ -79,6 +90,8 @@ class LIGHTGROUP_PT_compositor_panel(bpy.types.Panel):
         if addon_name in context.preferences.addons:
             prefs = context.preferences.addons[addon_name].preferences
         
+        jobs.draw_status(layout)
+        
         layout.label(text="Setup:")
         layout.operator("lightgroup.create_for_each_light", icon='LIGHT', text="Create Lightgroups for Each Light")
         
@@ -86,6 +99,14 @@ class LIGHTGROUP_PT_compositor_panel(bpy.types.Panel):
         
         layout.label(text="Compositor:")
         layout.operator("lightgroup.denoise_all_cycles", icon='NODE_COMPOSITING')
+        op = layout.operator("lightgroup.denoise_all_cycles", icon='DISK_DRIVE', text="Setup Denoise + Pass Cache")
+        op.write_pass_cache = True
+        op = layout.operator("lightgroup.denoise_all_cycles", icon='SELECT_SET', text="Setup Denoise + Crop Localized")
+        op.crop_localized = True
+        layout.operator("lightgroup.recomposite_from_cache", icon='FILE_REFRESH')
+        layout.operator("lightgroup.clear_scan_cache", icon='TRASH')
+        if context.object is not None:
+            layout.prop(context.object, "lightgroup_full_frame")
         
         layout.separator()
         
@@ -117,6 +138,7 @@ class LIGHTGROUP_PT_viewlayer_panel(bpy.types.Panel):
     
     def draw(self, context):
         layout = self.layout
+        jobs.draw_status(layout)
         layout.operator("lightgroup.clear_all_lightgroups", icon='X', text="Clear All Lightgroups")
         layout.operator("lightgroup.create_for_each_light", icon='LIGHT', text="Create Lightgroups for Each Light")
 
@@ -124,8 +146,11 @@ class LIGHTGROUP_PT_viewlayer_panel(bpy.types.Panel):
 classes = (
     updater.LightgroupToolsPreferences,
     operators.LIGHTGROUP_OT_clear_all_lightgroups,
+    operators.LIGHTGROUP_OT_clear_scan_cache,
     operators.LIGHTGROUP_OT_create_for_each_light,
     operators.LIGHTGROUP_OT_denoise_all_cycles,
+    operators.LIGHTGROUP_OT_build_recomp_scene,
+    operators.LIGHTGROUP_OT_recomposite_from_cache,
     operators.LIGHTGROUP_OT_assign_to_lightgroup,
     updater.LIGHTGROUP_OT_check_updates,
     updater.LIGHTGROUP_OT_download_update,
@@ -138,11 +163,18 @@ def register():
     updater.register_handlers()
     for cls in classes:
         bpy.utils.register_class(cls)
+    bpy.types.Object.lightgroup_full_frame = bpy.props.BoolProperty(
+        name="Keep Lightgroup Full Frame",
+        description="Never crop this object's lightgroup, e.g. when its reflections (glossy floors, windows) land outside its direct light",
+        default=False
+    )
 
 def unregister():
+    del bpy.types.Object.lightgroup_full_frame
     for cls in classes:
         bpy.utils.unregister_class(cls)
     updater.unregister_handlers()
+    jobs.shutdown()
 
 if __name__ == "__main__":
     register()
\ No newline at end of file
@@ -0,0 +1,294 @@
+import numpy as np
+
+
+# How many points to sample along each Bezier segment before resampling onto frames
+BEZIER_SAMPLES = 12
+
+# Keyframe interpolation enum values as returned by foreach_get
+INTERPOLATION_CONSTANT = 0
+INTERPOLATION_BEZIER = 2
+
+
+def scene_frames(scene):
+    """All frames in the scene's render range as a float array"""
+    step = max(scene.frame_step, 1)
+    return np.arange(scene.frame_start, scene.frame_end + 1, step, dtype=np.float64)
+
+
+def _channel_fcurves(anim_data):
+    """F-curves of the action assigned to some animation data or NLA strip (handles slotted actions)"""
+    action = anim_data.action
+    if action is None:
+        return None
+
+    # Blender 4.4+ keeps F-curves in a channelbag per action slot
+    slot = getattr(anim_data, "action_slot", None)
+    if slot is not None:
+        try:
+            from bpy_extras import anim_utils
+            channelbag = anim_utils.action_get_channelbag_for_slot(action, slot)
+            return channelbag.fcurves if channelbag else None
+        except (ImportError, AttributeError):
+            pass
+
+    return action.fcurves
+
+
+def find_fcurve(id_data, data_path, index=0):
+    """Return (fcurve, is_driver) animating a property, or (None, False) if it's static"""
+    anim_data = getattr(id_data, "animation_data", None)
+    if anim_data is None:
+        return None, False
+
+    # Drivers override keyframes, so check them first
+    driver_fcurve = anim_data.drivers.find(data_path, index=index)
+    if driver_fcurve is not None and not driver_fcurve.mute:
+        return driver_fcurve, True
+
+    fcurves = _channel_fcurves(anim_data)
+    if fcurves is not None:
+        fcurve = fcurves.find(data_path, index=index)
+        if fcurve is not None and not fcurve.mute:
+            return fcurve, False
+
+    return None, False
+
+
+def _nla_strips(anim_data):
+    """Unmuted NLA strips with an action that contribute to the animation"""
+    if not anim_data.use_nla:
+        return []
+    return [
+        strip
+        for track in anim_data.nla_tracks if not track.mute
+        for strip in track.strips if not strip.mute and strip.action is not None
+    ]
+
+
+def has_animation(id_data):
+    """Whether a datablock has an action, drivers or NLA strips that can change it over time"""
+    anim_data = getattr(id_data, "animation_data", None)
+    if anim_data is None:
+        return False
+    return anim_data.action is not None or len(anim_data.drivers) > 0 or len(_nla_strips(anim_data)) > 0
+
+
+def nla_animates(id_data, data_path, index=0):
+    """Whether an NLA strip animates a property (blending with the action is too much to evaluate here)"""
+    anim_data = getattr(id_data, "animation_data", None)
+    if anim_data is None:
+        return False
+
+    for strip in _nla_strips(anim_data):
+        fcurves = _channel_fcurves(strip)
+        if fcurves is not None and fcurves.find(data_path, index=index) is not None:
+            return True
+    return False
+
+
+def animated_paths(id_data):
+    """Data paths of every property on a datablock with keyframes or a driver"""
+    anim_data = getattr(id_data, "animation_data", None)
+    if anim_data is None:
+        return set()
+
+    paths = {fcurve.data_path for fcurve in anim_data.drivers}
+    paths.update(fcurve.data_path for fcurve in (_channel_fcurves(anim_data) or []))
+    for strip in _nla_strips(anim_data):
+        paths.update(fcurve.data_path for fcurve in (_channel_fcurves(strip) or []))
+    return paths
+
+
+def _driver_can_vary(fcurve):
+    """Whether a driver's value can change over time (variables or a frame expression)"""
+    driver = fcurve.driver
+    if len(driver.variables) > 0:
+        return True
+    return driver.type == 'SCRIPTED' and "frame" in driver.expression
+
+
+def sample_fcurve(fcurve, frames):
+    """Evaluate an F-curve at many frames at once without touching the scene frame"""
+    keyframes = fcurve.keyframe_points
+    count = len(keyframes)
+
+    # Modifiers (noise, cycles, ...) or no keys at all: let Blender evaluate each frame
+    if count == 0 or any(not modifier.mute for modifier in fcurve.modifiers):
+        return np.fromiter((fcurve.evaluate(frame) for frame in frames), dtype=np.float64, count=len(frames))
+
+    co = np.empty(count * 2, dtype=np.float64)
+    keyframes.foreach_get("co", co)
+    co = co.reshape(count, 2)
+
+    if count == 1:
+        return np.full(len(frames), co[0, 1])
+
+    left = np.empty(count * 2, dtype=np.float64)
+    right = np.empty(count * 2, dtype=np.float64)
+    interpolation = np.empty(count, dtype=np.int32)
+    keyframes.foreach_get("handle_left", left)
+    keyframes.foreach_get("handle_right", right)
+    keyframes.foreach_get("interpolation", interpolation)
+    left = left.reshape(count, 2)
+    right = right.reshape(count, 2)
+
+    # Build a dense polyline through the curve, one segment type at a time
+    starts = co[:-1]
+    ends = co[1:]
+    segment_interpolation = interpolation[:-1]
+    points = [co]
+
+    # Constant segments hold their value until just before the next key
+    constant = segment_interpolation == INTERPOLATION_CONSTANT
+    if np.any(constant):
+        hold = starts[constant].copy()
+        hold[:, 0] = ends[constant, 0] - 1e-4
+        points.append(hold)
+
+    # Bezier segments get sampled along the curve with the standard cubic formula
+    bezier = segment_interpolation == INTERPOLATION_BEZIER
+    if np.any(bezier):
+        t = np.linspace(0.0, 1.0, BEZIER_SAMPLES + 2)[1:-1].reshape(1, -1, 1)
+        p0 = starts[bezier][:, None, :]
+        p1 = right[:-1][bezier][:, None, :]
+        p2 = left[1:][bezier][:, None, :]
+        p3 = ends[bezier][:, None, :]
+        curve = ((1 - t) ** 3) * p0 + 3 * ((1 - t) ** 2) * t * p1 + 3 * (1 - t) * (t ** 2) * p2 + (t ** 3) * p3
+        points.append(curve.reshape(-1, 2))
+
+    # Linear and easing segments are treated as straight lines between keys
+    polyline = np.concatenate(points)
+    polyline = polyline[np.argsort(polyline[:, 0], kind="stable")]
+    xs = polyline[:, 0]
+    ys = polyline[:, 1]
+
+    values = np.interp(frames, xs, ys)
+
+    # Constant extrapolation is what np.interp already does, linear needs the end slopes
+    if fcurve.extrapolation == 'LINEAR':
+        before = frames < xs[0]
+        after = frames > xs[-1]
+        if np.any(before) and xs[1] != xs[0]:
+            slope = (ys[1] - ys[0]) / (xs[1] - xs[0])
+            values[before] = ys[0] + slope * (frames[before] - xs[0])
+        if np.any(after) and xs[-1] != xs[-2]:
+            slope = (ys[-1] - ys[-2]) / (xs[-1] - xs[-2])
+            values[after] = ys[-1] + slope * (frames[after] - xs[-1])
+
+    return values
+
+
+def sample_property(id_data, data_path, current_value, frames, index=0):
+    """Values of a property across frames, or None if a driver or NLA strip makes it unpredictable"""
+    fcurve, is_driver = find_fcurve(id_data, data_path, index)
+
+    if is_driver:
+        if _driver_can_vary(fcurve):
+            return None
+        # A driver with a constant expression just holds whatever it evaluates to now
+        return np.full(len(frames), float(current_value))
+
+    # NLA strips play on top of (or under) the action, so treat them like a varying driver
+    if nla_animates(id_data, data_path, index):
+        return None
+
+    if fcurve is None:
+        return np.full(len(frames), float(current_value))
+
+    return sample_fcurve(fcurve, frames)
+
+
+def emits_in_range(id_data, data_path, current_value, frames, index=0):
+    """Whether a strength/energy property is above zero on any frame in the range"""
+    values = sample_property(id_data, data_path, current_value, frames, index)
+    # Drivers we can't evaluate might turn on at any point, so count them in
+    return values is None or bool(np.any(values > 0))
+
+
+def renders_in_range(obj, frames):
+    """Mask of frames where the object isn't hidden from renders"""
+    hidden = sample_property(obj, "hide_render", obj.hide_render, frames)
+    if hidden is None:
+        return np.ones(len(frames), dtype=bool)
+    return hidden < 0.5
+
+
+def light_emits_in_range(obj, frames):
+    """Whether a light object has energy while visible on any frame in the range"""
+    light = obj.data
+    energy = sample_property(light, "energy", light.energy, frames)
+    if energy is None:
+        energy = np.ones(len(frames))
+    # Negative energy darkens, which still shows up in the lightgroup pass
+    return bool(np.any((energy != 0) & renders_in_range(obj, frames)))
+
+
+def _fcurve_channels(fcurves):
+    """Plain data describing the keys of some F-curves, for cache keys"""
+    channels = []
+    for fcurve in (fcurves or []):
+        count = len(fcurve.keyframe_points)
+        keys = np.empty(count * 6, dtype=np.float64)
+        if count:
+            co = np.empty(count * 2, dtype=np.float64)
+            left = np.empty(count * 2, dtype=np.float64)
+            right = np.empty(count * 2, dtype=np.float64)
+            fcurve.keyframe_points.foreach_get("co", co)
+            fcurve.keyframe_points.foreach_get("handle_left", left)
+            fcurve.keyframe_points.foreach_get("handle_right", right)
+            keys = np.concatenate([co, left, right])
+        channels.append([
+            fcurve.data_path,
+            fcurve.array_index,
+            fcurve.mute,
+            fcurve.extrapolation,
+            len(fcurve.modifiers),
+            np.round(keys, 5).tolist(),
+        ])
+    return channels
+
+
+def fingerprint(id_data, paths=None):
+    """Plain data describing the animation, NLA strips and drivers on a datablock, for cache keys
+
+    With paths, only channels animating those data paths are included.
+    """
+    anim_data = getattr(id_data, "animation_data", None)
+    if anim_data is None:
+        return None
+
+    def wanted(fcurves):
+        if fcurves is None or paths is None:
+            return fcurves
+        return [fcurve for fcurve in fcurves if fcurve.data_path in paths]
+
+    channels = _fcurve_channels(wanted(_channel_fcurves(anim_data)))
+
+    for strip in _nla_strips(anim_data):
+        strip_fcurves = wanted(_channel_fcurves(strip))
+        if paths is not None and not strip_fcurves:
+            continue
+        channels.append([
+            "strip",
+            strip.name,
+            strip.action.name_full,
+            strip.frame_start,
+            strip.frame_end,
+            strip.blend_type,
+            strip.influence,
+            sorted(_fcurve_channels(strip_fcurves), key=str),
+        ])
+
+    for driver_fcurve in wanted(anim_data.drivers):
+        driver = driver_fcurve.driver
+        channels.append([
+            "driver",
+            driver_fcurve.data_path,
+            driver_fcurve.array_index,
+            driver_fcurve.mute,
+            driver.type,
+            driver.expression,
+            [variable.name for variable in driver.variables],
+        ])
+
+    return sorted(channels, key=str)
@@ -0,0 +1,210 @@
+import bpy
+import json
+import os
+
+
+# Apply step: write a plan from planning.py back into bpy. Runs on the main thread only.
+# Everything created or changed is recorded by name so the operators can roll back on cancel.
+
+
+def apply_lightgroups(context, plan, previous_assignments):
+    """Create the planned lightgroups and assign lights/objects/world to them
+
+    previous_assignments gets a (bpy.data collection, name_full, old lightgroup) entry per change.
+    """
+    objects = {obj.name_full: obj for obj in bpy.data.objects}
+    assignments = plan["assignments"]
+    total = len(assignments)
+
+    for done, assignment in enumerate(assignments, 1):
+        if assignment["kind"] == 'WORLD':
+            collection, id_data = "worlds", context.scene.world
+        else:
+            collection, id_data = "objects", objects.get(assignment["key"])
+
+        if id_data is None:
+            print(f"WARNING: '{assignment['key']}' no longer exists, skipping")
+            yield done, total
+            continue
+
+        name = assignment["lightgroup"]
+        previous_assignments.append((collection, id_data.name_full, id_data.lightgroup))
+
+        # Create a new light group in the view layer tab, unless a previous run already did
+        # (adding it again would make an empty "_001" duplicate)
+        if name not in context.view_layer.lightgroups:
+            bpy.ops.scene.view_layer_add_lightgroup(name=name)
+
+        # Assign to the new group directly
+        id_data.lightgroup = name
+        yield done, total
+
+
+def _find_output(node, output_name):
+    """Find a node output by name"""
+    for output in node.outputs:
+        if output.name == output_name:
+            return output
+    return None
+
+
+def _link_to_slot(tree, output_node, slot_index, slot_name, source):
+    """Link a socket into the file output, adding a new layer slot after the first one"""
+    if slot_index == 0:
+        output_node.layer_slots[0].name = slot_name
+    else:
+        output_node.layer_slots.new(slot_name)
+    tree.links.new(source, output_node.inputs[slot_index])
+
+
+def copy_format(source, target, file_format):
+    """Copy image format settings (depth, codec, color management) to another node with a different file type"""
+    target.file_format = file_format
+    for prop in source.bl_rna.properties:
+        identifier = prop.identifier
+        if identifier in {"rna_type", "file_format"} or prop.is_readonly or prop.type == 'POINTER':
+            continue
+        try:
+            setattr(target, identifier, getattr(source, identifier))
+        except (AttributeError, TypeError, ValueError):
+            # Setting doesn't exist (or isn't allowed) for the new file type
+            pass
+
+
+def _add_crop_output(tree, new_node, source, slot, output_dir, row, image_format):
+    """Crop a denoised lightgroup to its window and write it to its own EXR"""
+    window = slot["crop"]["window"]
+
+    crop_node = new_node('CompositorNodeCrop')
+    crop_node.use_crop_size = True
+    crop_node.relative = False
+    crop_node.min_x, crop_node.min_y, crop_node.max_x, crop_node.max_y = window
+    crop_node.location = 1600, row
+
+    # Single-layer EXR so the file is only as big as the window, otherwise the same format
+    # as the full frame components so cropped lightgroups keep the same precision
+    output_node = new_node('CompositorNodeOutputFile')
+    output_node.base_path = output_dir
+    copy_format(image_format, output_node.format, 'OPEN_EXR')
+    output_node.file_slots[0].path = slot["crop"]["file"]
+    output_node.location = 1800, row
+
+    tree.links.new(source, crop_node.inputs[0])
+    tree.links.new(crop_node.outputs[0], output_node.inputs[0])
+
+
+def write_crop_sidecar(path, sidecar):
+    """Write the crop windows next to the renders so the cropped files can be put back together"""
+    path = bpy.path.abspath(path)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(sidecar, f, indent=2)
+        print(f"Wrote crop sidecar: {path}")
+    except OSError as e:
+        print(f"WARNING: Could not write crop sidecar {path}: {e}")
+
+
+def remove_crop_sidecar(path):
+    """Delete a sidecar left over from an earlier cropped setup"""
+    path = bpy.path.abspath(path)
+    if not os.path.exists(path):
+        return
+    try:
+        os.remove(path)
+        print(f"Removed stale crop sidecar: {path}")
+    except OSError as e:
+        print(f"WARNING: Could not remove stale crop sidecar {path}: {e}")
+
+
+def apply_compositor(tree, plan, new_nodes, source_node=None):
+    """Build the planned denoise compositor next to whatever is already in the tree
+
+    Passes are read from a new Render Layers node, or from source_node (e.g. an Image node
+    reading the pass cache) if one is given. The names of the created nodes go in new_nodes.
+    """
+    def new_node(node_type):
+        node = tree.nodes.new(type=node_type)
+        new_nodes.append(node.name)
+        return node
+
+    done = 0
+    total = len(plan["slots"]) + len(plan["cache_slots"]) + 1
+
+    if source_node is None:
+        source_node = new_node('CompositorNodeRLayers')
+        source_node.location = 0, 0
+
+    denoising_normal_output = _find_output(source_node, "Denoising Normal")
+    denoising_albedo_output = _find_output(source_node, "Denoising Albedo")
+
+    # Create Output Node
+    output_node = new_node('CompositorNodeOutputFile')
+    output_node.base_path = plan["output_path"]
+    output_node.location = 1000, -250
+    output_node.width = 500
+    done += 1
+    yield done, total
+
+    denoise_locations = {entry["lightgroup"]: entry["location"] for entry in plan["denoise"]}
+    first_output = None
+
+    slot_index = 0
+    for slot in plan["slots"]:
+        source = _find_output(source_node, slot["source"])
+
+        if slot["denoise"]:
+            denoise_node = new_node('CompositorNodeDenoise')
+            denoise_node.location = denoise_locations[slot["name"]]
+
+            # link the image to denoise, plus the denoising data
+            tree.links.new(source, denoise_node.inputs[0])
+            tree.links.new(denoising_normal_output, denoise_node.inputs[1])
+            tree.links.new(denoising_albedo_output, denoise_node.inputs[2])
+
+            if slot["crop"] is not None:
+                _add_crop_output(tree, new_node, denoise_node.outputs[0], slot, plan["output_dir"], denoise_node.location[1], output_node.format)
+                print(f"Cropped {slot['name']} to {slot['crop']['window']}")
+            else:
+                _link_to_slot(tree, output_node, slot_index, slot["name"], denoise_node.outputs[0])
+                slot_index += 1
+            if first_output is None:
+                first_output = denoise_node.outputs[0]
+        else:
+            _link_to_slot(tree, output_node, slot_index, slot["name"], source)
+            slot_index += 1
+            if first_output is None:
+                first_output = source
+            print(f"Added pass: {slot['name']}")
+
+        done += 1
+        yield done, total
+
+    # Raw passes for compositor-only re-runs, full float so the denoising data survives
+    if plan["pass_cache_path"]:
+        cache_node = new_node('CompositorNodeOutputFile')
+        cache_node.base_path = plan["pass_cache_path"]
+        cache_node.format.file_format = 'OPEN_EXR_MULTILAYER'
+        cache_node.format.color_depth = '32'
+        cache_node.format.exr_codec = 'ZIP'
+        cache_node.location = 500, 400
+        cache_node.width = 400
+
+        slot_index = 0
+        for name in plan["cache_slots"]:
+            source = _find_output(source_node, name)
+            if source is None:
+                print(f"WARNING: Could not find pass '{name}' for the pass cache")
+            else:
+                _link_to_slot(tree, cache_node, slot_index, name, source)
+                slot_index += 1
+            done += 1
+            yield done, total
+
+    # A compositor-only scene needs a Composite node to count as having an output
+    if plan["composite"] and first_output is not None:
+        composite_node = new_node('CompositorNodeComposite')
+        composite_node.location = 1000, 250
+        tree.links.new(first_output, composite_node.inputs[0])
+
+    return source_node, output_node
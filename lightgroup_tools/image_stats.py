@@ -0,0 +1,158 @@
+import bpy
+import json
+import os
+import socket
+import numpy as np
+
+
+# Images whose brightest pixel is below this luminance don't count as emitting
+DARK_THRESHOLD = 1e-4
+
+# Rec. 709 luminance weights
+LUMINANCE_WEIGHTS = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+CACHE_FILE = "image_stats.json"
+
+# Stats keyed by absolute file path, each entry remembers the mtime/size it was read at.
+# Loaded from disk once and shared by every scan in this Blender session.
+_stats = None
+_dirty = False
+
+# Images without a file on disk (packed/generated) or with unsaved paint are only cached
+# for this session, keyed by name and dirty state
+_session_stats = {}
+
+
+def cache_dir():
+    """Folder for the on-disk cache (preference, or next to the Blender config)"""
+    addon_name = __name__.partition('.')[0]
+    if addon_name in bpy.context.preferences.addons:
+        prefs = bpy.context.preferences.addons[addon_name].preferences
+        if prefs.image_stats_cache_dir:
+            return bpy.path.abspath(prefs.image_stats_cache_dir)
+    return os.path.join(os.path.dirname(bpy.utils.user_resource('CONFIG')), "lightgroup_tools_cache")
+
+
+def _read(path):
+    """Stats stored in a cache file, empty if it's missing or unreadable"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Lightgroup Tools: Ignoring unreadable image stats cache: {e}")
+        return {}
+
+
+def _load():
+    """Read the on-disk cache the first time it's needed"""
+    global _stats
+    if _stats is not None:
+        return _stats
+
+    path = os.path.join(cache_dir(), CACHE_FILE)
+    _stats = _read(path)
+    if _stats:
+        print(f"Lightgroup Tools: Loaded stats for {len(_stats)} image(s) from {path}")
+    return _stats
+
+
+def save():
+    """Write the cache to disk if anything new was measured"""
+    global _dirty
+    if not _dirty:
+        return
+
+    folder = cache_dir()
+    path = os.path.join(folder, CACHE_FILE)
+    try:
+        os.makedirs(folder, exist_ok=True)
+        # Other machines may have added entries since we loaded, keep theirs (ours win on clashes)
+        merged = _read(path)
+        merged.update(_stats)
+        _stats.update(merged)
+        # Write to a temp file first so other machines never read half a file
+        temp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(merged, f)
+        os.replace(temp_path, path)
+        _dirty = False
+    except OSError as e:
+        print(f"Lightgroup Tools: Could not save image stats cache: {e}")
+
+
+def _file_info(image):
+    """(absolute path, mtime, size) of the image file, or None if it isn't a plain file on disk"""
+    if image.packed_file is not None or image.source != 'FILE':
+        return None
+
+    path = os.path.normpath(bpy.path.abspath(image.filepath, library=image.library))
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return path, stat.st_mtime, stat.st_size
+
+
+def image_key(image):
+    """Cheap key that changes whenever the image's pixels could have changed"""
+    info = _file_info(image)
+    if info is None:
+        return [image.name_full, image.source, image.is_dirty]
+    return list(info)
+
+
+def compute_stats(image):
+    """Max and mean luminance of an image, read in one go through foreach_get"""
+    width, height = image.size
+    channels = image.channels
+    if width == 0 or height == 0 or channels == 0:
+        return None
+
+    pixels = np.empty(width * height * channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    pixels = pixels.reshape(-1, channels)
+
+    if channels >= 3:
+        luminance = pixels[:, :3] @ LUMINANCE_WEIGHTS
+    else:
+        # Greyscale (with or without alpha)
+        luminance = pixels[:, 0]
+
+    return {"max": float(luminance.max()), "mean": float(luminance.mean())}
+
+
+def image_stats(image):
+    """Luminance stats for an image, or None if they can't be worked out (sequences, UDIMs, ...)"""
+    global _dirty
+
+    # Only single still images can be read through pixels
+    if image.source not in {'FILE', 'GENERATED'}:
+        return None
+
+    # Painted but unsaved images don't match their file any more, so only cache them per session
+    info = _file_info(image)
+    if info is None or image.is_dirty:
+        key = (image.name_full, image.is_dirty)
+        if key not in _session_stats:
+            _session_stats[key] = compute_stats(image)
+        return _session_stats[key]
+
+    path, mtime, size = info
+    stats = _load()
+    entry = stats.get(path)
+    if entry and entry["mtime"] == mtime and entry["size"] == size:
+        return entry["stats"]
+
+    print(f"Lightgroup Tools: Measuring image {path}")
+    result = compute_stats(image)
+    stats[path] = {"mtime": mtime, "size": size, "stats": result}
+    _dirty = True
+    return result
+
+
+def is_dark(image):
+    """Whether an image is black everywhere (False if we can't tell)"""
+    stats = image_stats(image)
+    return stats is not None and stats["max"] <= DARK_THRESHOLD
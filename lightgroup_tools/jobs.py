@@ -0,0 +1,224 @@
+import concurrent.futures
+import time
+import traceback
+
+
+# How long each timer tick may spend working before handing control back to the UI
+TARGET_FRAME_TIME = 1.0 / 30.0
+TIMER_INTERVAL = 0.01
+
+# Progress of the running job, drawn by the panels (only one job runs at a time)
+status = {
+    "running": False,
+    "label": "",
+    "phase": "",
+    "done": 0,
+    "total": 0,
+}
+
+# Planning runs here so the UI keeps going while it works. Plans are pure functions of
+# plain data, so a ProcessPoolExecutor would work as well if planning ever gets heavy.
+# Created on first use, and again after shutdown() if the add-on is enabled again.
+_executor = None
+
+# Yielded by job steps that are waiting on background work rather than making progress
+WAITING = None
+
+# Events a running job lets through: view navigation only. Everything else (clicks, undo,
+# deletes, scene switches) is swallowed so nothing the job is working on changes under it.
+NAVIGATION_EVENTS = {
+    'MOUSEMOVE', 'INBETWEEN_MOUSEMOVE', 'MIDDLEMOUSE',
+    'WHEELUPMOUSE', 'WHEELDOWNMOUSE', 'WHEELINMOUSE', 'WHEELOUTMOUSE',
+    'TRACKPADPAN', 'TRACKPADZOOM', 'MOUSEROTATE', 'MOUSESMARTZOOM',
+    'WINDOW_DEACTIVATE', 'TIMER_REPORT',
+}
+
+
+def _timed_call(function, args):
+    """Run a function and also return how long it took"""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def timed(times, phase, steps):
+    """Run a step generator (with yield from), adding up only the time spent inside it"""
+    status["phase"] = phase
+    elapsed = 0.0
+    while True:
+        start = time.perf_counter()
+        try:
+            progress = next(steps)
+        except StopIteration as stop:
+            times[phase] = elapsed + time.perf_counter() - start
+            return stop.value
+        elapsed += time.perf_counter() - start
+        yield progress
+
+
+def in_background(times, phase, function, *args):
+    """Run a pure function on the worker thread (with yield from), waiting without blocking the UI"""
+    global _executor
+    status["phase"] = phase
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="lightgroup_tools")
+    future = _executor.submit(_timed_call, function, args)
+    while not future.done():
+        yield WAITING
+    result, times[phase] = future.result()
+    return result
+
+
+def run_steps(steps):
+    """Run a step generator to the end in one go and return its result"""
+    while True:
+        try:
+            progress = next(steps)
+        except StopIteration as stop:
+            return stop.value
+        if progress is WAITING:
+            time.sleep(0.001)
+
+
+def shutdown():
+    """Stop the worker thread (when the add-on is disabled or reloaded)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def print_times(label, times):
+    """Print how long each phase of a job took"""
+    summary = ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in times.items())
+    print(f"{label} timings: {summary}")
+
+
+def _redraw_panels(context):
+    """Tag the areas that show our panels so the status updates"""
+    if context.screen is None:
+        return
+    for area in context.screen.areas:
+        if area.type in {'VIEW_3D', 'NODE_EDITOR', 'PROPERTIES'}:
+            area.tag_redraw()
+
+
+def draw_status(layout):
+    """Draw the running job's progress into a panel"""
+    if not status["running"]:
+        return
+
+    box = layout.box()
+    box.label(text=status["label"], icon='TIME')
+    if status["total"]:
+        box.label(text=f"{status['phase'].title()}: {status['done']}/{status['total']}")
+    else:
+        box.label(text=f"{status['phase'].title()}...")
+    box.label(text="Press Esc to cancel", icon='CANCEL')
+
+
+class ModalJobMixin:
+    """Runs an operator's work either in one go (execute) or in time-sliced chunks (invoke)
+
+    Operators using this must define job_steps(context): a generator that yields (done, total)
+    after each small unit of work (or WAITING while background work runs) and returns the
+    operator result set. They can also override job_rollback(context) to undo whatever the
+    steps changed if the user cancels. Rollbacks should look datablocks up again by name
+    rather than keep bpy references.
+    """
+
+    def job_rollback(self, context):
+        pass
+
+    def execute(self, context):
+        # Scripts and batch runs go through here and just run every step
+        return run_steps(self.job_steps(context)) or {'FINISHED'}
+
+    def invoke(self, context, event):
+        if status["running"]:
+            self.report({'WARNING'}, f"{status['label']} is still running")
+            return {'CANCELLED'}
+
+        self._steps = self.job_steps(context)
+        self._chunk_size = 1
+        self._started = False
+
+        status.update(running=True, label=self.bl_label, phase="", done=0, total=0)
+
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self._timer = wm.event_timer_add(TIMER_INTERVAL, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            print(f"{self.bl_label}: Cancelled, rolling back")
+            self._stop(context)
+            self.report({'WARNING'}, f"{self.bl_label} cancelled")
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER':
+            if event.type in NAVIGATION_EVENTS or event.type.startswith('NDOF'):
+                return {'PASS_THROUGH'}
+            return {'RUNNING_MODAL'}
+
+        start = time.perf_counter()
+        self._started = True
+        waiting = False
+        try:
+            for _ in range(self._chunk_size):
+                progress = next(self._steps)
+                # Background work isn't done yet, check again next tick
+                if progress is WAITING:
+                    waiting = True
+                    break
+                status["done"], status["total"] = progress
+        except StopIteration as stop:
+            self._end_job(context)
+            return stop.value or {'FINISHED'}
+        except Exception as e:
+            print(f"{self.bl_label}: Error, rolling back: {e}")
+            traceback.print_exc()
+            self._stop(context)
+            self.report({'ERROR'}, f"{self.bl_label} failed: {e}")
+            return {'CANCELLED'}
+
+        # Grow or shrink the chunk so each tick takes about one UI frame
+        elapsed = time.perf_counter() - start
+        if waiting:
+            pass
+        elif elapsed < TARGET_FRAME_TIME * 0.5:
+            self._chunk_size *= 2
+        elif elapsed > TARGET_FRAME_TIME:
+            self._chunk_size = max(1, int(self._chunk_size * TARGET_FRAME_TIME / elapsed))
+
+        if status["total"]:
+            context.window_manager.progress_update(int(100 * status["done"] / status["total"]))
+        _redraw_panels(context)
+        return {'RUNNING_MODAL'}
+
+    def cancel(self, context):
+        # Blender stopped the job itself, e.g. because another file is being loaded
+        print(f"{self.bl_label}: Stopped by Blender, rolling back")
+        self._stop(context)
+
+    def _stop(self, context):
+        """Close the steps and roll back, always ending the job even if the rollback fails"""
+        try:
+            self._steps.close()
+            # Nothing to undo if the first chunk hasn't run yet
+            if self._started:
+                self.job_rollback(context)
+        except Exception as e:
+            print(f"{self.bl_label}: Rollback failed: {e}")
+            traceback.print_exc()
+        finally:
+            self._end_job(context)
+
+    def _end_job(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        status.update(running=False, label="", phase="", done=0, total=0)
+        _redraw_panels(context)
@@ -1,4 +1,13 @@
 import bpy
+import time
+from . import animation
+from . import apply
+from . import jobs
+from . import planning
+from . import recomp
+from . import scan_cache
+from . import snapshot
+
 
 class LIGHTGROUP_OT_clear_all_lightgroups(bpy.types.Operator):
     """Delete all lightgroups from the current view layer"""
@@ -22,262 +31,304 @@ class LIGHTGROUP_OT_clear_all_lightgroups(bpy.types.Operator):
         return {'FINISHED'}
 
 
-class LIGHTGROUP_OT_create_for_each_light(bpy.types.Operator):
-    """Create a lightgroup for each light, world, and emissive object"""
-    bl_idname = "lightgroup.create_for_each_light"
-    bl_label = "Create Lightgroups"
+class LIGHTGROUP_OT_clear_scan_cache(bpy.types.Operator):
+    """Forget the scan results stored in this .blend so the next run rescans everything"""
+    bl_idname = "lightgroup.clear_scan_cache"
+    bl_label = "Clear Scan Cache"
     bl_options = {'REGISTER', 'UNDO'}
     
     def execute(self, context):
-        lightGroupsAmount = 0
-        lightGroupsNames = []
-
-        # Get all the lights in the scene
-        lights = [obj for obj in context.scene.objects if obj.type == 'LIGHT']
-
-        # Create a light group for each light and assign the light to it
-        for i, light in enumerate(lights):
-            oldName = light.name
-            newName = oldName.replace(".", "_")
-            
-            # Create a new light group in the view layer tab
-            bpy.ops.scene.view_layer_add_lightgroup(name=newName)
-            
-            # Assign the light to the new group directly
-            light.lightgroup = newName
-            
-            # Increment our light group counter and add name to the list
-            lightGroupsAmount += 1
-            lightGroupsNames.append(newName)
-            
-        # Make a new lightgroup for world
-        bpy.ops.scene.view_layer_add_lightgroup(name="World")
-        # Assign World to world lightgroup
-        context.scene.world.lightgroup = "World"
-        # Increment our light group counter and add name to the list
-        lightGroupsAmount += 1
-        lightGroupsNames.append("World")
-
-        emissive_materials = []
-        emissive_objects = []
-
-        # Loop through all the materials in the scene
-        for material in bpy.data.materials:
-            if not material.use_nodes:
-                continue
-            
-            # Loop through all the nodes in the material's node tree
-            for node in material.node_tree.nodes:
-                # Check if the node is an Emission shader
-                if node.type == 'EMISSION':
-                    # Check if it's connected or has non-zero strength
-                    is_connected = any(output.is_linked for output in node.outputs)
-                    has_strength = node.inputs[1].default_value > 0 if len(node.inputs) > 1 else True
-                    
-                    if is_connected or has_strength:
-                        # Avoid duplicates
-                        if material.name not in emissive_materials:
-                            emissive_materials.append(material.name)
-                            print(f"Found Emissive Mat: {material.name}")
-                        break
+        if scan_cache.clear(context.scene):
+            self.report({'INFO'}, "Scan cache cleared")
+        else:
+            self.report({'INFO'}, "No scan cache to clear")
+        return {'FINISHED'}
 
-        # Check Principled BSDF for emission
-        for material in bpy.data.materials:
-            if not material.use_nodes:
-                continue
-            
-            for node in material.node_tree.nodes:
-                if node.type == 'BSDF_PRINCIPLED':
-                    # Find emission sockets by name (more reliable than index)
-                    emission_socket = None
-                    emission_strength_socket = None
-                    
-                    for input_socket in node.inputs:
-                        if input_socket.name == "Emission Color":
-                            emission_socket = input_socket
-                        elif input_socket.name == "Emission Strength":
-                            emission_strength_socket = input_socket
-                    
-                    # Check if emission strength > 0 or if emission is connected
-                    has_emission_strength = emission_strength_socket and emission_strength_socket.default_value > 0
-                    has_emission_connection = emission_strength_socket and emission_strength_socket.is_linked
-                    has_color_connection = emission_socket and emission_socket.is_linked
-                    
-                    if has_emission_strength or has_emission_connection or has_color_connection:
-                        # Avoid duplicates
-                        if material.name not in emissive_materials:
-                            emissive_materials.append(material.name)
-                            print(f"Found Principled BSDF Mat with emission: {material.name}")
-                        break
 
+class LIGHTGROUP_OT_create_for_each_light(jobs.ModalJobMixin, bpy.types.Operator):
+    """Create a lightgroup for each light, world, and emissive object"""
+    bl_idname = "lightgroup.create_for_each_light"
+    bl_label = "Create Lightgroups"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    use_cache: bpy.props.BoolProperty(
+        name="Use Scan Cache",
+        description="Reuse scan results stored in the .blend for materials and objects that haven't changed",
+        default=True
+    )
+    
+    def job_rollback(self, context):
+        """Put back the lightgroups and assignments from before the run"""
+        # Look everything up again, the references from the run may not be valid any more
+        lookups = {}
+        for collection, key, old_lightgroup in reversed(self._previous_assignments):
+            if collection not in lookups:
+                lookups[collection] = {id_data.name_full: id_data for id_data in getattr(bpy.data, collection)}
+            id_data = lookups[collection].get(key)
+            if id_data is not None:
+                id_data.lightgroup = old_lightgroup
+        
+        scene = bpy.data.scenes.get(self._scene_name)
+        view_layer = scene.view_layers.get(self._view_layer_name) if scene else None
+        if view_layer is None:
+            return
+        lightgroups = view_layer.lightgroups
+        for i in range(len(lightgroups) - 1, -1, -1):
+            if lightgroups[i].name not in self._lightgroups_before:
+                lightgroups.remove(lightgroups[i])
+    
+    def job_steps(self, context):
+        # Remember what was there so a cancel can roll back cleanly
+        self._scene_name = context.scene.name
+        self._view_layer_name = context.view_layer.name
+        self._lightgroups_before = {lg.name for lg in context.view_layer.lightgroups}
+        self._previous_assignments = []
+        times = {}
+        
+        # Every frame in the render range, so lights that switch on later aren't missed
+        frames = animation.scene_frames(context.scene)
+        
+        # Reuse results from the last run for anything whose fingerprint hasn't changed
+        scene = context.scene
+        cache = scan_cache.load(scene) if self.use_cache else scan_cache.new_cache()
+        
+        # Snapshot -> plan (off the main thread) -> apply
+        sources = yield from jobs.timed(times, "snapshot", snapshot.scan_lightgroup_sources(context, cache, frames))
+        plan = yield from jobs.in_background(times, "plan", planning.plan_lightgroups, sources)
+        
         # Print out the list of materials that use emission
-        print(f"Total emissive materials found: {len(emissive_materials)}")
-        print(emissive_materials)
-
-        # Find objects using emissive materials
-        for obj in bpy.data.objects:
-            # Check if object has material slots
-            if not hasattr(obj, 'material_slots'):
-                continue
-            
-            # Iterate through all material slots
-            for slot in obj.material_slots:
-                # Handle missing materials (null check)
-                if slot.material is None:
-                    continue
-                
-                # Check if material name is in material_list
-                if slot.material.name in emissive_materials:
-                    # Avoid duplicate objects
-                    if obj not in emissive_objects:
-                        print(f"Found Object using Emission: {obj.name}")
-                        emissive_objects.append(obj)
-                    break
-
-        # Create a light group for each emissive object and assign it
-        for i, emissive_object in enumerate(emissive_objects):
-            oldName = emissive_object.name
-            newName = oldName.replace(".", "_")
-            
-            # Create a new light group in the view layer tab
-            bpy.ops.scene.view_layer_add_lightgroup(name=newName)
-            
-            # Assign the object to the new group directly
-            emissive_object.lightgroup = newName
-            
-            # Increment our light group counter and add name to the list
-            lightGroupsAmount += 1
-            lightGroupsNames.append(newName)
-
-        print(f"\nTotal lightgroups created: {lightGroupsAmount}")
+        print(f"Total emissive materials found: {len(plan['emissive_materials'])}")
+        print(plan["emissive_materials"])
+        
+        yield from jobs.timed(times, "apply", apply.apply_lightgroups(context, plan, self._previous_assignments))
+        
+        # Keep the scan results for the next run
+        scan_cache.save(scene, cache)
+        
+        lightGroupsNames = [assignment["lightgroup"] for assignment in plan["assignments"]]
+        print(f"\nTotal lightgroups created: {len(lightGroupsNames)}")
         print(f"Lightgroup names: {lightGroupsNames}")
+        jobs.print_times(self.bl_label, times)
         
-        self.report({'INFO'}, f"Created {lightGroupsAmount} lightgroups")
+        self.report({'INFO'}, f"Created {len(lightGroupsNames)} lightgroups")
         return {'FINISHED'}
 
 
-class LIGHTGROUP_OT_denoise_all_cycles(bpy.types.Operator):
+class LIGHTGROUP_OT_denoise_all_cycles(jobs.ModalJobMixin, bpy.types.Operator):
     """Set up compositor to denoise all lightgroups (Cycles only)"""
     bl_idname = "lightgroup.denoise_all_cycles"
     bl_label = "Setup Denoise Compositor"
     bl_options = {'REGISTER', 'UNDO'}
     
-    def execute(self, context):
+    use_cache: bpy.props.BoolProperty(
+        name="Use Scan Cache",
+        description="Skip rebuilding the compositor if it still matches the layout stored in the .blend",
+        default=True
+    )
+    
+    write_pass_cache: bpy.props.BoolProperty(
+        name="Write Pass Cache",
+        description="Also write the raw lightgroup and denoising passes to a multilayer EXR, so denoise/output changes can be recomposited without rendering again",
+        default=False
+    )
+    
+    crop_localized: bpy.props.BoolProperty(
+        name="Crop Localized Lightgroups",
+        description="Write lightgroups that only light part of the frame as cropped EXRs, with a JSON sidecar for reassembly",
+        default=False
+    )
+    
+    crop_margin: bpy.props.FloatProperty(
+        name="Crop Margin",
+        description="Extra space around each estimated footprint, as a fraction of the frame",
+        default=0.05,
+        min=0.0,
+        max=0.5,
+        subtype='FACTOR'
+    )
+    
+    def _options(self, footprints):
+        """Operator options (and footprints) that change the layout, for the compositor cache fingerprint"""
+        return {
+            # Pass cache and crop file names are built from the .blend name, so Save As needs a rebuild
+            "blend_name": recomp.blend_name(),
+            "write_pass_cache": self.write_pass_cache,
+            "crop_margin": self.crop_margin if self.crop_localized else None,
+            "footprints": footprints,
+        }
+    
+    def job_rollback(self, context):
+        """Remove the nodes this run added and restore the settings it changed"""
+        # Look everything up by name, the references from the run may not be valid any more
+        scene = bpy.data.scenes.get(self._scene_name)
+        if scene is None:
+            return
+        
+        tree = scene.node_tree
+        if tree is not None:
+            for name in self._new_nodes:
+                node = tree.nodes.get(name)
+                if node is not None:
+                    tree.nodes.remove(node)
+        self._new_nodes = []
+        
+        scene.use_nodes = self._use_nodes_before
+        view_layer = scene.view_layers.get(self._view_layer_name)
+        if view_layer is not None:
+            view_layer.cycles.denoising_store_passes = self._store_passes_before
+    
+    def job_steps(self, context):
+        scene = context.scene
+        
+        # Remember the settings we change so a cancel can put them back
+        self._scene_name = scene.name
+        self._view_layer_name = context.view_layer.name
+        self._new_nodes = []
+        self._use_nodes_before = scene.use_nodes
+        self._store_passes_before = context.view_layer.cycles.denoising_store_passes
+        times = {}
+        
         # Check if Cycles is the active render engine
-        if context.scene.render.engine != 'CYCLES':
+        if scene.render.engine != 'CYCLES':
             self.report({'ERROR'}, "This script requires Cycles render engine. Please switch to Cycles and try again.")
             return {'CANCELLED'}
         
-        # SET UP COMPOSITOR
-        # Prep lightgroups variables
-        lightGroups = context.scene.view_layers["ViewLayer"].lightgroups
-        lightGroupsAmount = len(lightGroups)
-        lightGroupsNames = []
-        i = 0
-        while i < lightGroupsAmount:
-            lightGroupsNames.append(lightGroups[i].name)
-            i += 1
+        # Relative output paths would resolve against Blender's working directory
+        if self.write_pass_cache and not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the .blend before setting up a pass cache")
+            return {'CANCELLED'}
+        if self.crop_localized and not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the .blend before cropping localized lightgroups")
+            return {'CANCELLED'}
+        
+        # Screen-space footprints of each lightgroup, for cropping the localized ones
+        footprints = None
+        if self.crop_localized:
+            footprints = yield from jobs.timed(times, "footprints", snapshot.scan_lightgroup_footprints(context, animation.scene_frames(scene)))
+        
+        # Skip the rebuild if the tree is exactly what we built last time from the same inputs
+        cache = scan_cache.load(scene) if self.use_cache else scan_cache.new_cache()
+        if self.use_cache and scene.use_nodes and scene.node_tree:
+            lightGroupsNames = [lg.name for lg in scene.view_layers["ViewLayer"].lightgroups]
+            existingRenderLayers = snapshot.find_render_layers_node(scene.node_tree)
             
-        print(lightGroupsNames)
-        # Make sure compositor nodes are on
-        context.scene.use_nodes = True
+            layout = cache["compositor"]
+            if (layout
+                    and layout.get("fingerprint") == scan_cache.compositor_fingerprint(lightGroupsNames, existingRenderLayers, self._options(footprints))
+                    and layout.get("tree") == scan_cache.hash_node_tree(scene.node_tree)):
+                print("Compositor layout unchanged since last run, skipping rebuild")
+                self.report({'INFO'}, "Compositor already up to date")
+                return {'FINISHED'}
+        
+        # Make sure compositor nodes and denoising passes are on before reading the passes
+        scene.use_nodes = True
         context.view_layer.cycles.denoising_store_passes = True
-        tree = context.scene.node_tree
-        # Clear all previous nodes so we can control where they are
-        for node in tree.nodes:
-            tree.nodes.remove(node)
-            
-        renderLayersNode = tree.nodes.new(type='CompositorNodeRLayers')
-        renderLayersNode.location = 0, 0
-        links = tree.links
-        
-        # Helper function to find output by name
-        def find_output(node, output_name):
-            for output in node.outputs:
-                if output.name == output_name:
-                    return output
-            return None
-        
-        # Find the denoising outputs by name
-        denoisingNormalOutput = find_output(renderLayersNode, "Denoising Normal")
-        denoisingAlbedoOutput = find_output(renderLayersNode, "Denoising Albedo")
-        
-        # Check if denoising outputs exist
-        if not denoisingNormalOutput or not denoisingAlbedoOutput:
-            print("ERROR: Denoising outputs not found. Make sure 'Denoising Data' is enabled in render settings.")
-            self.report({'ERROR'}, "Denoising outputs not found. Enable 'Denoising Data' in render settings.")
+        tree = scene.node_tree
+        
+        # Snapshot -> plan (off the main thread) -> apply
+        start = time.perf_counter()
+        inputs = snapshot.scan_compositor_inputs(context)
+        times["snapshot"] = time.perf_counter() - start
+        print(inputs["lightgroups"])
+        
+        cropPlan = None
+        if footprints is not None:
+            cropPlan = yield from jobs.in_background(times, "crop plan", planning.plan_crops, footprints, recomp.blend_name(), self.crop_margin)
+        crops = cropPlan["crops"] if cropPlan else None
+        
+        passCachePath = recomp.pass_cache_path() if self.write_pass_cache else None
+        plan = yield from jobs.in_background(times, "plan", planning.plan_compositor, inputs, passCachePath, False, crops)
+        
+        if plan["error"]:
+            print(f"ERROR: {plan['error']}")
+            self.report({'ERROR'}, plan["error"])
+            self.job_rollback(context)
             return {'CANCELLED'}
         
-        # Create Output Node
-        outputNode = tree.nodes.new(type='CompositorNodeOutputFile')
-        outputNode.base_path = "//../../04_Renders/01_Components/{blend_name}_"
-        outputNode.location = 1000, -250
-        outputNode.width = 500
+        for source in plan["missing"]:
+            print(f"WARNING: Could not find output for light group '{source}'")
         
-        # Track which outputs we've already used
-        usedOutputs = set()
+        # Previous nodes get cleared once the new setup is finished, so we can control where
+        # things are without losing the old tree if the run is cancelled halfway
+        oldNodes = [node.name for node in tree.nodes]
+        renderLayersNode, _ = yield from jobs.timed(times, "apply", apply.apply_compositor(tree, plan, self._new_nodes))
         
-        # Current slot index for file output
-        slotIndex = 0
+        # New setup is complete, clear out the previous nodes
+        for name in oldNodes:
+            node = tree.nodes.get(name)
+            if node is not None:
+                tree.nodes.remove(node)
         
-        # Process light groups with denoising
-        i = 0
-        while i < lightGroupsAmount:
-            denoiseNode = tree.nodes.new(type='CompositorNodeDenoise')
-            denoiseNode.location = 500, i * -250
-            
-            # Find the light group output by name with "Combined_" prefix
-            lightGroupOutputName = f"Combined_{lightGroupsNames[i]}"
-            lightGroupOutput = find_output(renderLayersNode, lightGroupOutputName)
-            
-            if lightGroupOutput and denoisingNormalOutput and denoisingAlbedoOutput:
-                # Track that we're using these outputs
-                usedOutputs.add(lightGroupOutputName)
-                usedOutputs.add("Denoising Normal")
-                usedOutputs.add("Denoising Albedo")
-                
-                # link the image to denoise
-                links.new(lightGroupOutput, denoiseNode.inputs[0])
-                
-                # link the denoising data
-                links.new(denoisingNormalOutput, denoiseNode.inputs[1])
-                links.new(denoisingAlbedoOutput, denoiseNode.inputs[2])
-                
-                # link the denoiser to file output
-                if slotIndex == 0:
-                    outputNode.layer_slots[0].name = lightGroupsNames[i]
-                    links.new(denoiseNode.outputs[0], outputNode.inputs[slotIndex])
-                else:
-                    outputNode.layer_slots.new(lightGroupsNames[i])
-                    links.new(denoiseNode.outputs[0], outputNode.inputs[slotIndex])
-                
-                slotIndex += 1
-            else:
-                print(f"WARNING: Could not find output for light group '{lightGroupOutputName}'")
-            
-            i += 1
+        # Sidecar tells comp (and the recomposite scene) where each cropped file sits in the frame
+        sidecarPath = planning.crop_sidecar_path(recomp.blend_name())
+        if crops:
+            apply.write_crop_sidecar(sidecarPath, cropPlan["sidecar"])
+        elif bpy.data.filepath:
+            apply.remove_crop_sidecar(sidecarPath)
         
-        # Now add all remaining passes (except Denoising Depth) directly to file output
-        for output in renderLayersNode.outputs:
-            # Skip if we've already used this output, or if it's Denoising Depth, or if it's not enabled
-            if output.name in usedOutputs or output.name == "Denoising Depth" or output.name == "Noisy Image" or not output.enabled:
-                continue
-            
-            # Add this pass to the file output
-            if slotIndex == 0:
-                outputNode.layer_slots[0].name = output.name
-                links.new(output, outputNode.inputs[slotIndex])
-            else:
-                outputNode.layer_slots.new(output.name)
-                links.new(output, outputNode.inputs[slotIndex])
-            
-            slotIndex += 1
-            print(f"Added pass: {output.name}")
+        # Store the layout we just built so an unchanged re-run can skip it
+        cache["compositor"] = {
+            "fingerprint": scan_cache.compositor_fingerprint(inputs["lightgroups"], renderLayersNode, self._options(footprints)),
+            "tree": scan_cache.hash_node_tree(tree),
+        }
+        scan_cache.save(scene, cache)
+        jobs.print_times(self.bl_label, times)
         
         self.report({'INFO'}, "Compositor setup complete")
         return {'FINISHED'}
 
 
+class LIGHTGROUP_OT_build_recomp_scene(bpy.types.Operator):
+    """Build a compositor-only scene that runs the denoise/output setup on the pass cache instead of a render"""
+    bl_idname = "lightgroup.build_recomp_scene"
+    bl_label = "Build Recomposite Scene"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    def execute(self, context):
+        recompScene, error = recomp.build_recomp_scene(context.scene)
+        if error:
+            print(f"ERROR: {error}")
+            self.report({'ERROR'}, error)
+            return {'CANCELLED'}
+        
+        self.report({'INFO'}, f"Built '{recompScene.name}'. Headless: blender -b file.blend --python-expr \"import bpy; bpy.ops.lightgroup.recomposite_from_cache()\"")
+        return {'FINISHED'}
+
+
+class LIGHTGROUP_OT_recomposite_from_cache(jobs.ModalJobMixin, bpy.types.Operator):
+    """Run the denoise/output compositor over the frame range from the pass cache, without rendering"""
+    bl_idname = "lightgroup.recomposite_from_cache"
+    bl_label = "Recomposite from Cache"
+    bl_options = {'REGISTER'}
+    
+    def job_steps(self, context):
+        scene = context.scene
+        times = {}
+        
+        start = time.perf_counter()
+        recompScene, error = recomp.build_recomp_scene(scene)
+        times["build"] = time.perf_counter() - start
+        if error:
+            print(f"ERROR: {error}")
+            self.report({'ERROR'}, error)
+            return {'CANCELLED'}
+        
+        # The recomposite scene has no Render Layers node, so each "render" is compositing only
+        frames = list(range(scene.frame_start, scene.frame_end + 1, max(scene.frame_step, 1)))
+        jobs.status["phase"] = "compositing"
+        start = time.perf_counter()
+        for done, frame in enumerate(frames, 1):
+            recompScene.frame_set(frame)
+            bpy.ops.render.render(scene=recompScene.name)
+            print(f"Recomposited frame {frame}")
+            yield done, len(frames)
+        times["compositing"] = time.perf_counter() - start
+        jobs.print_times(self.bl_label, times)
+        
+        self.report({'INFO'}, f"Recomposited {len(frames)} frame(s) from the pass cache")
+        return {'FINISHED'}
+
+
 class LIGHTGROUP_OT_assign_to_lightgroup(bpy.types.Operator):
     """Assign selected objects and lights to a lightgroup"""
     bl_idname = "lightgroup.assign_to_lightgroup"
@@ -0,0 +1,204 @@
+# Pure-Python planning: everything in here works on plain data from snapshot.py and
+# never touches bpy, so it can run in a worker thread/process or outside Blender.
+
+import math
+
+
+# Render layer outputs that never go to the file output
+SKIPPED_PASSES = {"Denoising Depth", "Noisy Image"}
+
+# Spacing between denoise nodes in the generated compositor tree
+ROW_HEIGHT = 250
+
+# Where the denoised components go
+OUTPUT_DIR = "//../../04_Renders/01_Components/"
+OUTPUT_BASE_PATH = OUTPUT_DIR + "{blend_name}_"
+
+# Cropping a lightgroup isn't worth a separate file if it still covers this much of the frame
+MAX_CROP_AREA = 0.6
+
+# Raw passes for compositor-only re-runs are cached here as multilayer EXRs
+PASS_CACHE_DIR = "//../../04_Renders/00_PassCache/"
+
+
+def pass_cache_base_path(blend_name):
+    """File Output base path for the pass cache of a .blend"""
+    return f"{PASS_CACHE_DIR}{blend_name}_"
+
+
+def pass_cache_frame_path(blend_name, frame):
+    """Path of one frame of the pass cache (File Output adds a 4 digit frame number)"""
+    return f"{pass_cache_base_path(blend_name)}{frame:04d}.exr"
+
+
+def lightgroup_name(name):
+    """Lightgroup name for a light/object name (periods aren't allowed)"""
+    return name.replace(".", "_")
+
+
+def material_is_emissive(summary):
+    """Check a material summary for an Emission shader or an emissive Principled BSDF"""
+    for node in summary["emission_nodes"]:
+        # Driven by a texture that is black everywhere
+        if node["color_dark"] or node["strength_dark"]:
+            continue
+        # Connected, or has non-zero strength somewhere in the frame range
+        if node["outputs_linked"] or node["strength_emits"]:
+            print(f"Found Emissive Mat: {summary['label']}")
+            return True
+
+    for node in summary["principled_nodes"]:
+        if node["color_dark"] or node["strength_dark"]:
+            continue
+        if node["strength_emits"] or node["strength_linked"] or node["color_linked"]:
+            print(f"Found Principled BSDF Mat with emission: {summary['label']}")
+            return True
+
+    return False
+
+
+def plan_lightgroups(snapshot):
+    """Work out which lightgroup every light, the world and each emissive object goes in"""
+    assignments = []
+    skipped_lights = []
+
+    # A lightgroup for each light that emits at some point in the frame range
+    for light in snapshot["lights"]:
+        if light["emits"]:
+            assignments.append({"kind": 'LIGHT', "key": light["key"], "lightgroup": lightgroup_name(light["name"])})
+        else:
+            print(f"Skipping light with no energy in frame range: {light['name']}")
+            skipped_lights.append(light["key"])
+
+    # World always gets its own
+    if snapshot["has_world"]:
+        assignments.append({"kind": 'WORLD', "key": "", "lightgroup": "World"})
+
+    emissive_materials = [summary["key"] for summary in snapshot["materials"] if material_is_emissive(summary)]
+    emissive_set = set(emissive_materials)
+
+    # Objects that render at some point and use one of the emissive materials
+    for obj in snapshot["objects"]:
+        if not obj["renders"]:
+            continue
+        if any(name in emissive_set for name in obj["materials"]):
+            print(f"Found Object using Emission: {obj['name']}")
+            assignments.append({"kind": 'OBJECT', "key": obj["key"], "lightgroup": lightgroup_name(obj["name"])})
+
+    return {
+        "assignments": assignments,
+        "emissive_materials": emissive_materials,
+        "skipped_lights": skipped_lights,
+    }
+
+
+def plan_crops(footprint_snapshot, blend_name, margin=0.05):
+    """Pixel crop windows for lightgroups that only light part of the frame, plus a sidecar for reassembly
+
+    Windows are [min_x, min_y, max_x, max_y] in pixels, inclusive, with the origin at the bottom left
+    like the compositor. Lightgroups that reach the whole frame (or nothing on screen) aren't cropped.
+    """
+    width, height = footprint_snapshot["resolution"]
+    crops = {}
+
+    for name, members in footprint_snapshot["footprints"].items():
+        if not members or any(bounds is None for bounds in members):
+            continue
+
+        # Union of all members, padded and clamped to the frame
+        x0 = max(0.0, min(bounds[0] for bounds in members) - margin)
+        y0 = max(0.0, min(bounds[1] for bounds in members) - margin)
+        x1 = min(1.0, max(bounds[2] for bounds in members) + margin)
+        y1 = min(1.0, max(bounds[3] for bounds in members) + margin)
+
+        if x1 <= x0 or y1 <= y0:
+            continue
+        if (x1 - x0) * (y1 - y0) > MAX_CROP_AREA:
+            continue
+
+        crops[name] = {
+            "window": [
+                int(x0 * width),
+                int(y0 * height),
+                min(width, math.ceil(x1 * width)) - 1,
+                min(height, math.ceil(y1 * height)) - 1,
+            ],
+            "file": crop_file_prefix(blend_name, name),
+        }
+
+    sidecar = {
+        "resolution": [width, height],
+        "origin": "bottom-left",
+        "lightgroups": {
+            name: {"window": crop["window"], "path": OUTPUT_DIR + crop["file"]}
+            for name, crop in crops.items()
+        },
+    }
+    return {"crops": crops, "sidecar": sidecar}
+
+
+def crop_file_prefix(blend_name, lightgroup):
+    """File name prefix of a cropped lightgroup output (frame number and extension get added)"""
+    return f"{blend_name}_{lightgroup}_crop_"
+
+
+def crop_sidecar_path(blend_name):
+    """Path of the JSON describing where each cropped output sits in the full frame"""
+    return f"{OUTPUT_DIR}{blend_name}_crops.json"
+
+
+def plan_compositor(snapshot, pass_cache_path=None, composite=False, crops=None):
+    """Lay out the denoise compositor: one denoise node per lightgroup, then the other passes
+
+    With pass_cache_path every raw pass the layout reads is also written to a multilayer EXR,
+    and composite adds a Composite node (needed when rendering a compositor-only scene).
+    Lightgroups in crops (from plan_crops) get their own cropped file instead of a layer slot.
+    """
+    crops = crops or {}
+    outputs = {output["name"]: output for output in snapshot["outputs"]}
+
+    if "Denoising Normal" not in outputs or "Denoising Albedo" not in outputs:
+        return {"error": "Denoising outputs not found. Enable 'Denoising Data' in render settings."}
+
+    denoise = []
+    missing = []
+    used_outputs = set()
+    slots = []
+
+    for row, name in enumerate(snapshot["lightgroups"]):
+        # Light group outputs are named with a "Combined_" prefix
+        source = f"Combined_{name}"
+        if source in outputs:
+            used_outputs.update((source, "Denoising Normal", "Denoising Albedo"))
+            denoise.append({"lightgroup": name, "source": source, "location": (500, row * -ROW_HEIGHT)})
+            slots.append({"name": name, "source": source, "denoise": True, "crop": crops.get(name)})
+        else:
+            missing.append(source)
+
+    # All remaining enabled passes go straight to the file output
+    for output in snapshot["outputs"]:
+        name = output["name"]
+        if name in used_outputs or name in SKIPPED_PASSES or not output["enabled"]:
+            continue
+        slots.append({"name": name, "source": name, "denoise": False, "crop": None})
+
+    # Cache slots keep the render layer names so the cached EXR reads back like a render
+    cache_slots = []
+    if pass_cache_path:
+        for slot in slots:
+            cache_slots.append(slot["source"])
+        for name in ("Denoising Normal", "Denoising Albedo"):
+            if name not in cache_slots:
+                cache_slots.append(name)
+
+    return {
+        "error": None,
+        "denoise": denoise,
+        "missing": missing,
+        "slots": slots,
+        "output_dir": OUTPUT_DIR,
+        "output_path": OUTPUT_BASE_PATH,
+        "pass_cache_path": pass_cache_path,
+        "cache_slots": cache_slots,
+        "composite": composite,
+    }
@@ -0,0 +1,138 @@
+import bpy
+import json
+import os
+from . import apply
+from . import jobs
+from . import planning
+
+
+# Compositor-only re-runs: a second scene whose compositor reads the pass cache EXRs
+# through an Image node instead of a Render Layers node, so Blender skips rendering.
+
+RECOMP_SUFFIX = "_Recomp"
+
+
+def blend_name():
+    """Name of the saved .blend without extension, used in the pass cache file names"""
+    return bpy.path.display_name_from_filepath(bpy.data.filepath) or "untitled"
+
+
+def pass_cache_path():
+    """File Output base path the render writes the pass cache to"""
+    return planning.pass_cache_base_path(blend_name())
+
+
+def recomp_scene_name(scene):
+    return scene.name + RECOMP_SUFFIX
+
+
+def _copy_color_management(source, target):
+    """Copy display/view transform settings (from a scene or an image format override)"""
+    # Display first, the available view transforms depend on it
+    target.display_settings.display_device = source.display_settings.display_device
+    for attribute in ("view_transform", "look", "exposure", "gamma", "use_curve_mapping"):
+        setattr(target.view_settings, attribute, getattr(source.view_settings, attribute))
+
+
+def _get_or_create_scene(scene):
+    """The compositor-only scene for a shot, matching its frame range and resolution"""
+    recomp = bpy.data.scenes.get(recomp_scene_name(scene))
+    if recomp is None:
+        recomp = bpy.data.scenes.new(recomp_scene_name(scene))
+
+    recomp.frame_start = scene.frame_start
+    recomp.frame_end = scene.frame_end
+    recomp.frame_step = scene.frame_step
+    recomp.render.fps = scene.render.fps
+    recomp.render.fps_base = scene.render.fps_base
+    recomp.render.resolution_x = scene.render.resolution_x
+    recomp.render.resolution_y = scene.render.resolution_y
+    recomp.render.resolution_percentage = scene.render.resolution_percentage
+    recomp.render.pixel_aspect_x = scene.render.pixel_aspect_x
+    recomp.render.pixel_aspect_y = scene.render.pixel_aspect_y
+    # New File Output nodes take their format from their own scene, so match the shot's
+    # output format and color management or the recomposite writes different files
+    settings = scene.render.image_settings
+    apply.copy_format(settings, recomp.render.image_settings, settings.file_format)
+    if settings.color_management == 'OVERRIDE':
+        _copy_color_management(settings, recomp.render.image_settings)
+    _copy_color_management(scene, recomp)
+    recomp.sequencer_colorspace_settings.name = scene.sequencer_colorspace_settings.name
+
+    recomp.render.use_compositing = True
+    recomp.render.use_sequencer = False
+    recomp.use_nodes = True
+    return recomp
+
+
+def _load_cache_image(scene):
+    """Load the pass cache as an image sequence, or None if it hasn't been rendered yet"""
+    path = planning.pass_cache_frame_path(blend_name(), scene.frame_start)
+    if not os.path.exists(bpy.path.abspath(path)):
+        return None
+
+    image = bpy.data.images.load(path, check_existing=True)
+    image.source = 'SEQUENCE'
+    image.reload()
+    return image
+
+
+def _load_crops():
+    """Crop windows from the sidecar written by the denoise setup, so recomposites crop the same way"""
+    path = bpy.path.abspath(planning.crop_sidecar_path(blend_name()))
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "r") as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Ignoring unreadable crop sidecar {path}: {e}")
+        return None
+
+    return {
+        name: {"window": entry["window"], "file": os.path.basename(entry["path"])}
+        for name, entry in sidecar["lightgroups"].items()
+    }
+
+
+def build_recomp_scene(scene):
+    """Build (or rebuild) the compositor-only scene for a shot, returns (scene, error)"""
+    if scene.name.endswith(RECOMP_SUFFIX):
+        return None, "Run this from the original shot scene, not the recomposite scene"
+    if not bpy.data.filepath:
+        return None, "Save the .blend first, the pass cache is found relative to it"
+
+    image = _load_cache_image(scene)
+    if image is None:
+        path = planning.pass_cache_frame_path(blend_name(), scene.frame_start)
+        return None, f"No pass cache found at {path}. Render with 'Write Pass Cache' first."
+
+    recomp = _get_or_create_scene(scene)
+    tree = recomp.node_tree
+    for node in list(tree.nodes):
+        tree.nodes.remove(node)
+
+    # Image node stands in for the Render Layers node, one file per scene frame
+    image_node = tree.nodes.new(type='CompositorNodeImage')
+    image_node.image = image
+    image_node.frame_start = scene.frame_start
+    image_node.frame_duration = scene.frame_end - scene.frame_start + 1
+    image_node.frame_offset = scene.frame_start - 1
+    image_node.use_auto_refresh = True
+    image_node.location = 0, 0
+
+    # Same snapshot -> plan -> apply as the render compositor, just with the cached passes
+    inputs = {
+        "lightgroups": [lightgroup.name for lightgroup in scene.view_layers["ViewLayer"].lightgroups],
+        "outputs": [{"name": output.name, "enabled": output.enabled} for output in image_node.outputs],
+    }
+    plan = planning.plan_compositor(inputs, composite=True, crops=_load_crops())
+    if plan["error"]:
+        return None, plan["error"]
+
+    for source in plan["missing"]:
+        print(f"WARNING: Pass cache has no '{source}' pass")
+
+    jobs.run_steps(apply.apply_compositor(tree, plan, [image_node.name], source_node=image_node))
+    return recomp, None
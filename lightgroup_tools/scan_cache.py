@@ -0,0 +1,319 @@
+import bpy
+import hashlib
+import json
+from . import animation
+from . import image_stats
+
+
+# Scan results live on the scene as a JSON string so they are saved with the .blend
+CACHE_PROPERTY = "lightgroup_tools_scan_cache"
+CACHE_VERSION = 4
+
+
+def new_cache():
+    """Return an empty cache dictionary"""
+    return {
+        "version": CACHE_VERSION,
+        "scene": "",
+        "materials": {},
+        "objects": {},
+        "compositor": {},
+    }
+
+
+def load(scene):
+    """Load the scan cache stored on the scene, or a fresh one if missing/outdated"""
+    raw = scene.get(CACHE_PROPERTY)
+    if not raw:
+        return new_cache()
+
+    try:
+        cache = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        print(f"Lightgroup Tools: Ignoring unreadable scan cache: {e}")
+        return new_cache()
+
+    if cache.get("version") != CACHE_VERSION:
+        print("Lightgroup Tools: Scan cache is from another version, rescanning")
+        return new_cache()
+
+    # Make sure all sections exist even if an older run only wrote some of them
+    for key, value in new_cache().items():
+        cache.setdefault(key, value)
+    return cache
+
+
+def save(scene, cache):
+    """Store the scan cache on the scene (written to disk when the .blend is saved)"""
+    scene[CACHE_PROPERTY] = json.dumps(cache, sort_keys=True)
+
+
+def clear(scene):
+    """Remove the scan cache from the scene, returns True if there was one"""
+    if CACHE_PROPERTY in scene:
+        del scene[CACHE_PROPERTY]
+        return True
+    return False
+
+
+def _digest(data):
+    """Hash any JSON-serialisable data into a short hex string"""
+    text = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _library_path(id_data):
+    """Library file path of a datablock, empty for local data"""
+    if id_data is not None and id_data.library is not None:
+        return id_data.library.filepath
+    return ""
+
+
+def _socket_value(socket):
+    """Plain Python version of a socket's default value (or None if it has none)"""
+    if not hasattr(socket, "default_value"):
+        return None
+
+    value = socket.default_value
+    # Vectors and colors come back as bpy arrays, turn them into rounded lists
+    try:
+        return [round(float(v), 6) for v in value]
+    except TypeError:
+        pass
+
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, (bool, int, str)):
+        return value
+    # Object/image/etc. pointer sockets
+    return getattr(value, "name_full", str(value))
+
+
+# Properties every node has (location, size, label, ...) that don't change what it does
+BASE_NODE_PROPERTIES = {prop.identifier for prop in bpy.types.Node.bl_rna.properties}
+
+
+def _property_values(struct, skip=(), animated=(), path=""):
+    """Plain values of a struct's number/text/enum properties, leaving out animated ones"""
+    values = []
+    for prop in struct.bl_rna.properties:
+        identifier = prop.identifier
+        if identifier == "rna_type" or identifier in skip or prop.type not in {'BOOLEAN', 'INT', 'FLOAT', 'STRING', 'ENUM'}:
+            continue
+        # Animated values change with the playhead, animation.fingerprint covers them
+        if f"{path}.{identifier}" in animated:
+            continue
+
+        value = getattr(struct, identifier)
+        if isinstance(value, set):
+            value = sorted(value)
+        elif prop.type == 'FLOAT':
+            try:
+                value = [round(float(v), 6) for v in value]
+            except TypeError:
+                value = round(value, 6)
+        elif prop.type in {'BOOLEAN', 'INT'} and not isinstance(value, (bool, int)):
+            value = list(value)
+        values.append([identifier, value])
+    return values
+
+
+def _node_properties(node, animated):
+    """Settings of a node beyond its sockets: denoise/crop options, file output paths and formats"""
+    path = node.path_from_id() if animated else ""
+    values = _property_values(node, BASE_NODE_PROPERTIES, animated, path)
+
+    image_format = getattr(node, "format", None)
+    if image_format is not None:
+        values.append(["format", _property_values(image_format)])
+
+    for collection in ("file_slots", "layer_slots"):
+        slots = getattr(node, collection, None)
+        if slots is not None:
+            values.append([collection, [_property_values(slot) for slot in slots]])
+
+    return values
+
+
+def hash_node_tree(node_tree):
+    """Content hash of a (compositor) node tree: nodes and their settings, unlinked input values and links"""
+    if node_tree is None:
+        return ""
+
+    animated = animation.animated_paths(node_tree)
+
+    nodes = []
+    for node in node_tree.nodes:
+        inputs = []
+        for input_socket in node.inputs:
+            # Linked inputs ignore their default value, so only hash the link state
+            if input_socket.is_linked:
+                inputs.append([input_socket.identifier, True])
+            elif animated and input_socket.path_from_id() + ".default_value" in animated:
+                inputs.append([input_socket.identifier, "animated"])
+            else:
+                inputs.append([input_socket.identifier, _socket_value(input_socket)])
+
+        # Group nodes point at another tree, image nodes at an image
+        group = getattr(node, "node_tree", None)
+        image = getattr(node, "image", None)
+
+        nodes.append([
+            node.bl_idname,
+            node.name,
+            node.mute,
+            inputs,
+            _node_properties(node, animated),
+            group.name_full if group else "",
+            image.name_full if image else "",
+        ])
+
+    links = []
+    for link in node_tree.links:
+        links.append([
+            link.from_node.name,
+            link.from_socket.identifier,
+            link.to_node.name,
+            link.to_socket.identifier,
+            link.is_muted,
+        ])
+
+    return _digest([sorted(nodes, key=str), sorted(links)])
+
+
+def _frame_range(frames):
+    """First frame, last frame and count of a frame array"""
+    if len(frames) == 0:
+        return []
+    return [float(frames[0]), float(frames[-1]), len(frames)]
+
+
+# Shader nodes the emission scan reads (see snapshot.material_summary)
+EMISSION_SOCKETS = {
+    'EMISSION': {"Color", "Strength"},
+    'BSDF_PRINCIPLED': {"Emission Color", "Emission Strength"},
+}
+
+
+def _upstream_key(socket):
+    """What feeds an input: nodes, mute state and image file keys, following first inputs upstream"""
+    keys = []
+    for link in socket.links:
+        node = link.from_node
+        image = getattr(node, "image", None)
+        keys.append([
+            node.bl_idname,
+            node.name,
+            node.mute,
+            link.is_muted,
+            link.from_socket.name,
+            image_stats.image_key(image) if image is not None else None,
+            # The dark texture check looks through pass-through nodes via their first input
+            _upstream_key(node.inputs[0]) if len(node.inputs) else None,
+        ])
+    return keys
+
+
+def _emission_inputs_key(node_tree):
+    """Plain data for just the emission sockets the scan reads, plus their animation paths"""
+    animated = animation.animated_paths(node_tree)
+    nodes = []
+    paths = set()
+
+    for node in node_tree.nodes:
+        names = EMISSION_SOCKETS.get(node.type)
+        if names is None:
+            continue
+
+        inputs = []
+        for input_socket in node.inputs:
+            if input_socket.name not in names:
+                continue
+            path = input_socket.path_from_id() + ".default_value"
+            paths.add(path)
+            # Animated values change with the playhead, the F-curves are fingerprinted instead
+            value = "animated" if path in animated else _socket_value(input_socket)
+            inputs.append([input_socket.identifier, input_socket.is_linked, value, _upstream_key(input_socket)])
+
+        nodes.append([
+            node.bl_idname,
+            node.name,
+            [output.is_linked for output in node.outputs],
+            inputs,
+        ])
+
+    return sorted(nodes, key=str), paths
+
+
+def material_fingerprint(material, frames):
+    """Fingerprint of everything the emission scan looks at for a material
+
+    Only the emission sockets, what feeds them and their animation are read, so a cache
+    hit stays cheaper than scanning the material again.
+    """
+    node_tree = material.node_tree if material.use_nodes else None
+    inputs, paths = _emission_inputs_key(node_tree) if node_tree is not None else ([], set())
+    return _digest([
+        material.use_nodes,
+        _library_path(material),
+        inputs,
+        animation.fingerprint(node_tree, paths),
+        _frame_range(frames),
+    ])
+
+
+def object_fingerprint(obj, material_fingerprints, frames):
+    """Fingerprint of an object's type, library, render visibility and material slots"""
+    slots = []
+    if hasattr(obj, 'material_slots'):
+        for slot in obj.material_slots:
+            if slot.material is None:
+                slots.append(None)
+            else:
+                name = slot.material.name_full
+                slots.append([name, material_fingerprints.get(name, "")])
+
+    return _digest([
+        obj.name_full,
+        obj.type,
+        _library_path(obj),
+        obj.hide_render,
+        animation.fingerprint(obj),
+        _frame_range(frames),
+        slots,
+    ])
+
+
+def scene_fingerprint(scene):
+    """Cheap whole-file fingerprint: datablock counts and linked library paths"""
+    return _digest([
+        len(scene.objects),
+        len(bpy.data.objects),
+        len(bpy.data.materials),
+        sorted(library.filepath for library in bpy.data.libraries),
+    ])
+
+
+def prune(cache):
+    """Drop cached entries for datablocks that no longer exist in the file"""
+    # Keys are name_full so linked datablocks don't clash with local ones
+    existing_materials = {material.name_full for material in bpy.data.materials}
+    materials = cache["materials"]
+    for name in list(materials):
+        if name not in existing_materials:
+            del materials[name]
+
+    existing_objects = {obj.name_full for obj in bpy.data.objects}
+    objects = cache["objects"]
+    for name in list(objects):
+        if name not in existing_objects:
+            del objects[name]
+
+
+def compositor_fingerprint(lightgroup_names, render_layers_node, options=None):
+    """Fingerprint of the inputs (and operator options) the denoise compositor layout is built from"""
+    enabled_outputs = []
+    if render_layers_node is not None:
+        enabled_outputs = [output.name for output in render_layers_node.outputs if output.enabled]
+
+    return _digest([list(lightgroup_names), enabled_outputs, options])
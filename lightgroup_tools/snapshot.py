@@ -0,0 +1,476 @@
+import bpy
+import math
+import numpy as np
+from bpy_extras.object_utils import world_to_camera_view
+from mathutils import Vector
+from . import animation
+from . import image_stats
+from . import scan_cache
+
+
+# Snapshot step: read what the planner needs out of bpy into plain dicts/lists.
+# Generators yield (done, total) so the modal jobs can spread them over several ticks.
+
+
+def _socket_emits_in_range(material, socket, frames):
+    """Check whether a strength socket is above zero on any frame, following its animation"""
+    data_path = socket.path_from_id() + ".default_value"
+    return animation.emits_in_range(material.node_tree, data_path, socket.default_value, frames)
+
+
+# Nodes that keep a black input black, so we can look straight through them
+PASS_THROUGH_NODES = {'REROUTE', 'RGBTOBW', 'SEPARATE_COLOR', 'SEPRGB'}
+
+
+def _socket_is_dark(socket):
+    """Whether a linked input only ever receives black from image textures"""
+    if not socket.is_linked:
+        return False
+
+    for link in socket.links:
+        node = link.from_node
+        if link.is_muted or node.mute:
+            return False
+
+        if node.type == 'TEX_IMAGE':
+            # Alpha of a black texture can still be 1, and a missing image renders pink
+            if link.from_socket.name != "Color" or node.image is None:
+                return False
+            if not image_stats.is_dark(node.image):
+                return False
+        elif node.type in PASS_THROUGH_NODES:
+            if not _socket_is_dark(node.inputs[0]):
+                return False
+        else:
+            # Anything else (math, mixes, procedural textures) could brighten it
+            return False
+
+    return True
+
+
+def material_summary(material, frames):
+    """Plain-data summary of the emission nodes in a material"""
+    emission_nodes = []
+    principled_nodes = []
+
+    for node in material.node_tree.nodes:
+        if node.type == 'EMISSION':
+            emission_nodes.append({
+                "outputs_linked": any(output.is_linked for output in node.outputs),
+                "strength_emits": _socket_emits_in_range(material, node.inputs[1], frames) if len(node.inputs) > 1 else True,
+                "color_dark": _socket_is_dark(node.inputs[0]),
+                "strength_dark": _socket_is_dark(node.inputs[1]) if len(node.inputs) > 1 else False,
+            })
+
+        elif node.type == 'BSDF_PRINCIPLED':
+            # Find emission sockets by name (more reliable than index)
+            emission_socket = None
+            emission_strength_socket = None
+
+            for input_socket in node.inputs:
+                if input_socket.name == "Emission Color":
+                    emission_socket = input_socket
+                elif input_socket.name == "Emission Strength":
+                    emission_strength_socket = input_socket
+
+            principled_nodes.append({
+                "strength_emits": bool(emission_strength_socket and _socket_emits_in_range(material, emission_strength_socket, frames)),
+                "strength_linked": bool(emission_strength_socket and emission_strength_socket.is_linked),
+                "color_linked": bool(emission_socket and emission_socket.is_linked),
+                "color_dark": bool(emission_socket and _socket_is_dark(emission_socket)),
+                "strength_dark": bool(emission_strength_socket and _socket_is_dark(emission_strength_socket)),
+            })
+
+    return {
+        "key": material.name_full,
+        "label": material.name,
+        "emission_nodes": emission_nodes,
+        "principled_nodes": principled_nodes,
+    }
+
+
+def object_summary(obj, frames):
+    """Plain-data summary of an object's material slots and render visibility"""
+    materials = []
+    # Check if object has material slots
+    if hasattr(obj, 'material_slots'):
+        for slot in obj.material_slots:
+            # Handle missing materials (null check)
+            if slot.material is not None:
+                materials.append(slot.material.name_full)
+
+    return {
+        "key": obj.name_full,
+        "name": obj.name,
+        "type": obj.type,
+        "materials": materials,
+        "renders": bool(animation.renders_in_range(obj, frames).any()),
+    }
+
+
+def scan_lightgroup_sources(context, cache, frames):
+    """Snapshot lights, world, materials and objects, reusing cached summaries where nothing changed"""
+    scene = context.scene
+    current_scene_fingerprint = scan_cache.scene_fingerprint(scene)
+    if cache["scene"] != current_scene_fingerprint:
+        scan_cache.prune(cache)
+        cache["scene"] = current_scene_fingerprint
+
+    candidate_lights = [obj for obj in scene.objects if obj.type == 'LIGHT']
+    done = 0
+    total = len(candidate_lights) + len(bpy.data.materials) + len(bpy.data.objects)
+
+    lights = []
+    for obj in candidate_lights:
+        lights.append({
+            "key": obj.name_full,
+            "name": obj.name,
+            "emits": animation.light_emits_in_range(obj, frames),
+        })
+        done += 1
+        yield done, total
+
+    materials = []
+    material_fingerprints = {}
+    rescanned_materials = 0
+
+    for material in bpy.data.materials:
+        done += 1
+        if not material.use_nodes:
+            continue
+
+        key = material.name_full
+        fingerprint = scan_cache.material_fingerprint(material, frames)
+        material_fingerprints[key] = fingerprint
+
+        entry = cache["materials"].get(key)
+        if entry and entry["fingerprint"] == fingerprint:
+            summary = entry["summary"]
+        else:
+            summary = material_summary(material, frames)
+            cache["materials"][key] = {"fingerprint": fingerprint, "summary": summary}
+            rescanned_materials += 1
+
+        materials.append(summary)
+        yield done, total
+
+    objects = []
+    rescanned_objects = 0
+
+    for obj in bpy.data.objects:
+        key = obj.name_full
+        fingerprint = scan_cache.object_fingerprint(obj, material_fingerprints, frames)
+
+        entry = cache["objects"].get(key)
+        if entry and entry["fingerprint"] == fingerprint:
+            summary = entry["summary"]
+        else:
+            summary = object_summary(obj, frames)
+            cache["objects"][key] = {"fingerprint": fingerprint, "summary": summary}
+            rescanned_objects += 1
+
+        objects.append(summary)
+        done += 1
+        yield done, total
+
+    print(f"Materials rescanned: {rescanned_materials} (rest reused from cache)")
+    print(f"Objects rescanned: {rescanned_objects} (rest reused from cache)")
+
+    # Keep any newly measured textures for the next scan/session
+    image_stats.save()
+
+    return {
+        "lights": lights,
+        "has_world": scene.world is not None,
+        "materials": materials,
+        "objects": objects,
+    }
+
+
+def find_render_layers_node(tree):
+    """First Render Layers node in a compositor tree, or None"""
+    if tree is None:
+        return None
+    for node in tree.nodes:
+        if node.type == 'R_LAYERS':
+            return node
+    return None
+
+
+def scan_compositor_inputs(context):
+    """Snapshot the lightgroup names and render layer passes the compositor is built from"""
+    scene = context.scene
+    lightgroups = scene.view_layers["ViewLayer"].lightgroups
+    lightgroup_names = [lightgroup.name for lightgroup in lightgroups]
+
+    # Pass names only exist as Render Layers node outputs, so borrow a node if there isn't one
+    tree = scene.node_tree
+    render_layers_node = find_render_layers_node(tree)
+    temporary_node = None
+    if render_layers_node is None and tree is not None:
+        temporary_node = tree.nodes.new(type='CompositorNodeRLayers')
+        render_layers_node = temporary_node
+
+    outputs = []
+    if render_layers_node is not None:
+        outputs = [{"name": output.name, "enabled": output.enabled} for output in render_layers_node.outputs]
+
+    if temporary_node is not None:
+        tree.nodes.remove(temporary_node)
+
+    return {
+        "lightgroups": lightgroup_names,
+        "outputs": outputs,
+    }
+
+
+# Irradiance (W/m^2) below which a light is treated as not reaching a surface
+IRRADIANCE_THRESHOLD = 0.01
+
+# Light settings that change how far it reaches besides its energy
+LIGHT_SIZE_PATHS = {"shadow_soft_size", "size", "size_y"}
+
+
+# Modifiers that can move geometry over time without any animation on the object itself
+DEFORMING_MODIFIERS = {
+    'ARMATURE', 'HOOK', 'LATTICE', 'MESH_DEFORM', 'SURFACE_DEFORM', 'CURVE', 'SHRINKWRAP',
+    'WAVE', 'OCEAN', 'CLOTH', 'SOFT_BODY', 'FLUID', 'DYNAMIC_PAINT', 'MESH_CACHE',
+    'MESH_SEQUENCE_CACHE', 'NODES',
+}
+
+
+def _is_deformed(obj):
+    """Whether an object's geometry can change over the shot (deform modifiers, geometry nodes, shape keys)"""
+    if any(modifier.type in DEFORMING_MODIFIERS for modifier in obj.modifiers):
+        return True
+    # Light and camera data animation (energy, lens, ...) is handled where it matters
+    data = obj.data
+    if data is None or obj.type in {'LIGHT', 'CAMERA'}:
+        return False
+    if animation.has_animation(data):
+        return True
+    shape_keys = getattr(data, "shape_keys", None)
+    return shape_keys is not None and animation.has_animation(shape_keys)
+
+
+def _is_animated(obj):
+    """Whether an object (or anything it's parented to) can move or deform, so its footprint isn't fixed"""
+    while obj is not None:
+        if animation.has_animation(obj) or _is_deformed(obj):
+            return True
+        if len(obj.constraints) > 0:
+            return True
+        obj = obj.parent
+    return False
+
+
+def _camera_is_fixed(scene, camera):
+    """Whether the shot's view stays put and can be projected: no motion, lens animation or camera switches"""
+    if camera is None or camera.data.type == 'PANO':
+        # Panoramic cameras don't project like world_to_camera_view expects
+        return False
+    if _is_animated(camera) or animation.has_animation(camera.data):
+        return False
+    return not any(marker.camera is not None for marker in scene.timeline_markers)
+
+
+def _falloff_radius(power):
+    """Distance at which the irradiance from a source of this power drops below the threshold"""
+    # Inverse square falloff, negative (darkening) sources reach just as far
+    return math.sqrt(abs(power) / (4.0 * math.pi * IRRADIANCE_THRESHOLD))
+
+
+def _light_radius(obj, frames):
+    """Distance at which a light's direct irradiance drops below the threshold, None if unbounded"""
+    light = obj.data
+    if light.type == 'SUN':
+        return None
+    if animation.animated_paths(light) & LIGHT_SIZE_PATHS:
+        return None
+
+    # Use the brightest the light gets over the shot
+    energy = animation.sample_property(light, "energy", light.energy, frames)
+    if energy is None:
+        return None
+    peak = float(np.abs(energy).max()) if len(energy) else light.energy
+
+    # Plus the size of the light itself
+    size = getattr(light, "shadow_soft_size", 0.0)
+    if light.type == 'AREA':
+        size = max(light.size, light.size_y)
+    return _falloff_radius(peak) + size
+
+
+def _emission_sockets(node):
+    """(color, strength) emission inputs of a shader node, or None if it doesn't emit"""
+    if node.type == 'EMISSION':
+        return node.inputs[0], node.inputs[1]
+    color = node.inputs.get("Emission Color")
+    strength = node.inputs.get("Emission Strength")
+    if color is None or strength is None:
+        return None
+    return color, strength
+
+
+def _emission_peak(obj, frames):
+    """Brightest emission (strength x color) over the shot, summed over all materials, None if unbounded"""
+    peak = 0.0
+    for slot in obj.material_slots:
+        material = slot.material
+        if material is None or not material.use_nodes:
+            continue
+
+        tree = material.node_tree
+        for node in tree.nodes:
+            # Emission inside a group isn't worth following
+            if node.type == 'GROUP':
+                return None
+            sockets = _emission_sockets(node)
+            if sockets is None:
+                continue
+
+            # Textures and other inputs could be any brightness
+            color, strength = sockets
+            if strength.is_linked:
+                return None
+            strengths = animation.sample_property(tree, strength.path_from_id() + ".default_value", strength.default_value, frames)
+            if strengths is None:
+                return None
+            if not np.any(strengths > 0):
+                continue
+            if color.is_linked:
+                return None
+
+            brightest = np.zeros(len(frames))
+            for index in range(3):
+                channel = animation.sample_property(tree, color.path_from_id() + ".default_value", color.default_value[index], frames, index)
+                if channel is None:
+                    return None
+                brightest = np.maximum(brightest, channel)
+
+            if len(frames):
+                peak += float((strengths * brightest).max())
+    return peak
+
+
+def _emitter_radius(obj, depsgraph, frames):
+    """Distance around an emissive mesh at which its irradiance drops below the threshold, None if unbounded"""
+    if obj.type != 'MESH':
+        return None
+    peak = _emission_peak(obj, frames)
+    if peak is None:
+        return None
+
+    # Surface area after modifiers, scaled up by the largest axis so it's never underestimated
+    mesh = obj.evaluated_get(depsgraph).data
+    areas = np.empty(len(mesh.polygons), dtype=np.float64)
+    mesh.polygons.foreach_get("area", areas)
+    scale = max(abs(axis) for axis in obj.matrix_world.to_scale())
+    area = float(areas.sum()) * scale * scale
+
+    # Treat the whole surface like one light of strength x area watts
+    return _falloff_radius(peak * area)
+
+
+def _world_bounds(obj):
+    """World-space axis-aligned bounds of an object's bounding box"""
+    corners = [obj.matrix_world @ Vector(corner) for corner in obj.bound_box]
+    low = Vector((min(c.x for c in corners), min(c.y for c in corners), min(c.z for c in corners)))
+    high = Vector((max(c.x for c in corners), max(c.y for c in corners), max(c.z for c in corners)))
+    return low, high
+
+
+def _project_bounds(scene, camera, low, high):
+    """Normalized screen bounds [x0, y0, x1, y1] of a world box, None if it reaches behind the camera"""
+    xs = []
+    ys = []
+    for x in (low.x, high.x):
+        for y in (low.y, high.y):
+            for z in (low.z, high.z):
+                projected = world_to_camera_view(scene, camera, Vector((x, y, z)))
+                if projected.z <= camera.data.clip_start:
+                    return None
+                xs.append(projected.x)
+                ys.append(projected.y)
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def _object_footprint(scene, camera, obj, depsgraph, frames):
+    """Screen bounds a light or emissive object can affect, None for the whole frame"""
+    # Reflections of the source can land anywhere, so the user can keep a member uncropped
+    if obj.lightgroup_full_frame or _is_animated(obj):
+        return None
+
+    if obj.type == 'LIGHT':
+        radius = _light_radius(obj, frames)
+        if radius is None:
+            return None
+        center = obj.matrix_world.translation
+        low = center - Vector((radius, radius, radius))
+        high = center + Vector((radius, radius, radius))
+    else:
+        radius = _emitter_radius(obj, depsgraph, frames)
+        if radius is None:
+            return None
+        low, high = _world_bounds(obj)
+        low = low - Vector((radius, radius, radius))
+        high = high + Vector((radius, radius, radius))
+
+    return _project_bounds(scene, camera, low, high)
+
+
+def _instanced_lightgroups(depsgraph, names):
+    """Lightgroups with members copied by collection instances, particles or geometry nodes"""
+    instanced = set()
+    for instance in depsgraph.object_instances:
+        if instance.is_instance:
+            lightgroup = instance.object.original.lightgroup
+            if lightgroup in names:
+                instanced.add(lightgroup)
+    return instanced
+
+
+def scan_lightgroup_footprints(context, frames):
+    """Snapshot the screen-space influence bounds of every member of each lightgroup
+
+    Only direct light is bounded. Glossy or refracted reflections of a source can land
+    anywhere, which is what the per-object "Keep Lightgroup Full Frame" option is for.
+    """
+    scene = context.scene
+    render = scene.render
+    scale = render.resolution_percentage / 100
+    resolution = [int(render.resolution_x * scale), int(render.resolution_y * scale)]
+
+    names = [lightgroup.name for lightgroup in scene.view_layers["ViewLayer"].lightgroups]
+    footprints = {name: [] for name in names}
+    snapshot = {
+        "resolution": resolution,
+        "footprints": footprints,
+    }
+
+    # World light reaches everywhere
+    if scene.world is not None and scene.world.lightgroup in footprints:
+        footprints[scene.world.lightgroup].append(None)
+
+    # A moving, zooming, switching, panoramic (or missing) camera means nothing stays put on screen
+    camera = scene.camera
+    if not _camera_is_fixed(scene, camera):
+        for members in footprints.values():
+            members.append(None)
+        return snapshot
+
+    # Instanced copies sit at other transforms than the original, so those groups stay full frame
+    depsgraph = context.evaluated_depsgraph_get()
+    for name in _instanced_lightgroups(depsgraph, footprints):
+        footprints[name].append(None)
+
+    members = [obj for obj in scene.objects if obj.lightgroup in footprints]
+    total = len(members)
+    for done, obj in enumerate(members, 1):
+        group = footprints[obj.lightgroup]
+        # No need to evaluate more members once a group is full frame anyway
+        if None not in group:
+            group.append(_object_footprint(scene, camera, obj, depsgraph, frames))
+        yield done, total
+
+    return snapshot
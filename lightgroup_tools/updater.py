@@ -17,6 +17,17 @@ class LightgroupToolsPreferences(bpy.types.AddonPreferences):
     download_url: bpy.props.StringProperty(default="")
     update_downloaded: bpy.props.BoolProperty(default=False)
     staged_update_path: bpy.props.StringProperty(default="")
+    
+    image_stats_cache_dir: bpy.props.StringProperty(
+        name="Image Stats Cache",
+        description="Folder for cached texture brightness stats (point it at a shared folder to reuse them across the studio)",
+        subtype='DIR_PATH',
+        default=""
+    )
+    
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "image_stats_cache_dir")
 
 
 class LIGHTGROUP_OT_check_updates(bpy.types.Operator):
@@ -0,0 +1,237 @@
+"""Tests for the parts of the add-on that run without Blender (planning and F-curve sampling)"""
+
+import importlib.util
+import pathlib
+
+import numpy as np
+import pytest
+
+
+PACKAGE_DIR = pathlib.Path(__file__).resolve().parent.parent / "lightgroup_tools"
+
+
+def _load(name):
+    # The package __init__ imports bpy, so load the pure modules straight from their files
+    spec = importlib.util.spec_from_file_location(f"lightgroup_tools_{name}", PACKAGE_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+planning = _load("planning")
+animation = _load("animation")
+
+
+# --- plan_lightgroups ---
+
+def _material(key, **node):
+    emission = {"outputs_linked": False, "strength_emits": False, "color_dark": False, "strength_dark": False}
+    emission.update(node)
+    return {"key": key, "label": key, "emission_nodes": [emission], "principled_nodes": []}
+
+
+def test_plan_lightgroups_assigns_lights_world_and_emissive_objects():
+    snapshot = {
+        "lights": [
+            {"key": "Key.001", "name": "Key.001", "emits": True},
+            {"key": "Off", "name": "Off", "emits": False},
+        ],
+        "has_world": True,
+        "materials": [
+            _material("Glow", strength_emits=True),
+            _material("Plain"),
+            _material("BlackTex", strength_emits=True, color_dark=True),
+        ],
+        "objects": [
+            {"key": "Sign", "name": "Sign", "type": 'MESH', "materials": ["Glow"], "renders": True},
+            {"key": "Hidden", "name": "Hidden", "type": 'MESH', "materials": ["Glow"], "renders": False},
+            {"key": "Wall", "name": "Wall", "type": 'MESH', "materials": ["Plain", "BlackTex"], "renders": True},
+        ],
+    }
+
+    plan = planning.plan_lightgroups(snapshot)
+
+    assert plan["assignments"] == [
+        {"kind": 'LIGHT', "key": "Key.001", "lightgroup": "Key_001"},
+        {"kind": 'WORLD', "key": "", "lightgroup": "World"},
+        {"kind": 'OBJECT', "key": "Sign", "lightgroup": "Sign"},
+    ]
+    assert plan["emissive_materials"] == ["Glow"]
+    assert plan["skipped_lights"] == ["Off"]
+
+
+# --- plan_compositor ---
+
+def _outputs(*names, disabled=()):
+    return [{"name": name, "enabled": name not in disabled} for name in names]
+
+
+def test_plan_compositor_needs_denoising_data():
+    plan = planning.plan_compositor({"lightgroups": ["Key"], "outputs": _outputs("Image", "Combined_Key")})
+    assert plan["error"]
+
+
+def test_plan_compositor_slots_and_missing_passes():
+    snapshot = {
+        "lightgroups": ["Key", "Rim"],
+        "outputs": _outputs(
+            "Image", "Alpha", "Noisy Image", "Denoising Normal", "Denoising Albedo", "Denoising Depth",
+            "Combined_Key", "Mist", disabled=("Mist",),
+        ),
+    }
+
+    plan = planning.plan_compositor(snapshot)
+
+    assert plan["error"] is None
+    assert plan["missing"] == ["Combined_Rim"]
+    assert [(slot["name"], slot["source"], slot["denoise"]) for slot in plan["slots"]] == [
+        ("Key", "Combined_Key", True),
+        ("Image", "Image", False),
+        ("Alpha", "Alpha", False),
+    ]
+    assert plan["cache_slots"] == []
+    assert not plan["composite"]
+
+
+def test_plan_compositor_cache_slots_include_denoising_data_once():
+    snapshot = {
+        "lightgroups": ["Key"],
+        "outputs": _outputs("Image", "Denoising Normal", "Denoising Albedo", "Combined_Key"),
+    }
+
+    plan = planning.plan_compositor(snapshot, pass_cache_path="//cache/shot_")
+
+    assert plan["pass_cache_path"] == "//cache/shot_"
+    assert plan["cache_slots"] == ["Combined_Key", "Image", "Denoising Normal", "Denoising Albedo"]
+
+
+def test_plan_compositor_crop_slots():
+    snapshot = {
+        "lightgroups": ["Key", "Lamp"],
+        "outputs": _outputs("Image", "Denoising Normal", "Denoising Albedo", "Combined_Key", "Combined_Lamp"),
+    }
+    crops = {"Lamp": {"window": [10, 20, 99, 199], "file": "shot_Lamp_crop_"}}
+
+    plan = planning.plan_compositor(snapshot, crops=crops)
+
+    slots = {slot["name"]: slot for slot in plan["slots"]}
+    assert slots["Lamp"]["crop"] == crops["Lamp"]
+    assert slots["Key"]["crop"] is None
+    assert slots["Image"]["crop"] is None
+
+
+# --- plan_crops ---
+
+def test_plan_crops_windows_and_sidecar():
+    footprints = {
+        "resolution": [1000, 500],
+        "footprints": {
+            # Two members, unioned then padded by the margin
+            "Lamp": [[0.2, 0.2, 0.3, 0.3], [0.25, 0.1, 0.4, 0.25]],
+            # Covers too much of the frame to be worth cropping
+            "Key": [[0.0, 0.0, 0.9, 0.9]],
+            # Unbounded member (sun, world, animated) keeps the whole frame
+            "Sun": [[0.1, 0.1, 0.2, 0.2], None],
+            # Entirely off screen
+            "Behind": [[1.2, 1.2, 1.5, 1.5]],
+            "Empty": [],
+        },
+    }
+
+    result = planning.plan_crops(footprints, "shot", margin=0.05)
+
+    assert set(result["crops"]) == {"Lamp"}
+    assert result["crops"]["Lamp"] == {"window": [150, 25, 449, 174], "file": "shot_Lamp_crop_"}
+    assert result["sidecar"] == {
+        "resolution": [1000, 500],
+        "origin": "bottom-left",
+        "lightgroups": {
+            "Lamp": {"window": [150, 25, 449, 174], "path": planning.OUTPUT_DIR + "shot_Lamp_crop_"},
+        },
+    }
+
+
+def test_plan_crops_clamps_to_frame():
+    footprints = {"resolution": [100, 100], "footprints": {"Corner": [[-0.2, -0.2, 0.1, 0.1]]}}
+
+    result = planning.plan_crops(footprints, "shot", margin=0.0)
+
+    assert result["crops"]["Corner"]["window"] == [0, 0, 9, 9]
+
+
+# --- sample_fcurve ---
+
+class FakeKeyframes:
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def foreach_get(self, attribute, buffer):
+        values = [value for key in self.keys for value in np.ravel(key[attribute])]
+        buffer[:] = values
+
+
+class FakeFCurve:
+    def __init__(self, keys, extrapolation='CONSTANT'):
+        self.keyframe_points = FakeKeyframes(keys)
+        self.modifiers = []
+        self.extrapolation = extrapolation
+
+
+def _key(frame, value, interpolation, left=None, right=None):
+    return {
+        "co": (frame, value),
+        "handle_left": left if left is not None else (frame, value),
+        "handle_right": right if right is not None else (frame, value),
+        "interpolation": interpolation,
+    }
+
+
+LINEAR = 1
+
+
+def test_sample_fcurve_constant_holds_until_next_key():
+    fcurve = FakeFCurve([
+        _key(1, 0.0, animation.INTERPOLATION_CONSTANT),
+        _key(5, 10.0, animation.INTERPOLATION_CONSTANT),
+    ])
+
+    values = animation.sample_fcurve(fcurve, np.arange(0, 8, dtype=np.float64))
+
+    np.testing.assert_allclose(values, [0, 0, 0, 0, 0, 10, 10, 10], atol=1e-2)
+
+
+def test_sample_fcurve_bezier_follows_curve():
+    # Flat handles give an ease in/out, so the midpoint is half way and the quarter point is below a quarter
+    fcurve = FakeFCurve([
+        _key(0, 0.0, animation.INTERPOLATION_BEZIER, right=(4, 0.0)),
+        _key(12, 1.0, animation.INTERPOLATION_BEZIER, left=(8, 1.0)),
+    ])
+
+    values = animation.sample_fcurve(fcurve, np.array([0.0, 3.0, 6.0, 12.0]))
+
+    assert values[0] == pytest.approx(0.0)
+    assert 0.0 < values[1] < 0.25
+    assert values[2] == pytest.approx(0.5, abs=1e-2)
+    assert values[3] == pytest.approx(1.0)
+
+
+def test_sample_fcurve_linear_extrapolation():
+    keys = [_key(0, 0.0, LINEAR), _key(10, 5.0, LINEAR)]
+    frames = np.array([-10.0, 5.0, 20.0])
+
+    constant = animation.sample_fcurve(FakeFCurve(keys), frames)
+    linear = animation.sample_fcurve(FakeFCurve(keys, extrapolation='LINEAR'), frames)
+
+    np.testing.assert_allclose(constant, [0.0, 2.5, 5.0])
+    np.testing.assert_allclose(linear, [-5.0, 2.5, 10.0])
+
+
+def test_sample_fcurve_single_key_is_flat():
+    fcurve = FakeFCurve([_key(3, 7.0, animation.INTERPOLATION_BEZIER)])
+
+    values = animation.sample_fcurve(fcurve, np.array([0.0, 3.0, 100.0]))
+
+    np.testing.assert_allclose(values, [7.0, 7.0, 7.0])